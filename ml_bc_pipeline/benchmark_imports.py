@@ -0,0 +1,48 @@
+""" Cold-start import benchmark
+
+    Measures, in fresh interpreters, the time it takes to import the scoring entry point
+    (ml_bc_pipeline.final_version) now that heavy backends are resolved lazily through
+    ml_bc_pipeline.registry, against importing it together with every heavy dependency, which
+    is what the eager top-level imports used to cost. Run it from the repository root:
+
+        python -m ml_bc_pipeline.benchmark_imports
+
+"""
+import sys
+import json
+import subprocess
+import importlib.util
+
+ENTRY_POINT = 'ml_bc_pipeline.final_version'
+HEAVY_MODULES = ['xgboost', 'gplearn', 'bayes_opt', 'matplotlib', 'eif', 'statsmodels', 'seaborn', 'imblearn',
+                 'prince', 'deap']
+
+
+def cold_import(modules, repeat=5):
+    """ Best wall time (in seconds) of importing modules in a fresh interpreter and the heavy modules it loaded """
+    code = ("import sys, time, json\n"
+            "start = time.perf_counter()\n"
+            + "".join("import {}\n".format(module) for module in modules) +
+            "elapsed = time.perf_counter() - start\n"
+            "print(json.dumps([elapsed, [m for m in {} if m in sys.modules]]))\n".format(HEAVY_MODULES))
+    timings = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', code], stdout=subprocess.PIPE, check=True).stdout
+        elapsed, loaded = json.loads(output.decode().strip().splitlines()[-1])
+        timings.append(elapsed)
+    return min(timings), loaded
+
+
+def main(repeat=5):
+    available = [module for module in HEAVY_MODULES if importlib.util.find_spec(module) is not None]
+    lazy_time, loaded = cold_import([ENTRY_POINT], repeat)
+    eager_time, _ = cold_import([ENTRY_POINT] + available, repeat)
+    print("Heavy modules installed: {}".format(", ".join(available) or "none"))
+    print("Heavy modules loaded by importing {}: {}".format(ENTRY_POINT, ", ".join(loaded) or "none"))
+    print("Cold start, lazy backends:  {:.3f}s".format(lazy_time))
+    print("Cold start, eager backends: {:.3f}s".format(eager_time))
+    print("Gain: {:.3f}s ({:.0%})".format(eager_time - lazy_time, 1 - lazy_time / eager_time))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+import datetime
+import numpy as np
+import pandas as pd
+
+OPERATIONS = ('sum', 'difference', 'product', 'ratio')
+
+
+def business_features(year=None):
+    """ Spec of the business features, as (name, operation, operands) in the order they are computed
+
+        Operands are column names, names of features defined earlier in the spec, or numbers. Ratios are
+        safe divisions: they are 0 where the denominator is 0.
+
+    """
+    year = datetime.datetime.now().year if year is None else year
+    amounts = ['MntWines', 'MntFruits', 'MntMeatProducts', 'MntFishProducts', 'MntSweetProducts', 'MntGoldProds']
+    return [
+        ('Web_Purchases_Per_Visit', 'ratio', ['NumWebPurchases', 'NumWebVisitsMonth']),
+        ('Total_Purchases', 'sum', ['NumWebPurchases', 'NumCatalogPurchases', 'NumStorePurchases']),
+        ('RatioWebPurchases', 'ratio', ['NumWebPurchases', 'Total_Purchases']),
+        ('RatioCatalogPurchases', 'ratio', ['NumCatalogPurchases', 'Total_Purchases']),
+        ('RatioStorePurchases', 'ratio', ['NumStorePurchases', 'Total_Purchases']),
+        ('Age', 'difference', [year, 'Year_Birth']),
+        ('TotalAcceptedCampaigns', 'sum', ['AcceptedCmp1', 'AcceptedCmp2', 'AcceptedCmp3', 'AcceptedCmp4',
+                                           'AcceptedCmp5']),
+        # Total amount spent and the ratios of money spent per category
+        ('TotalMoneySpent', 'sum', amounts),
+        ('RatioWines', 'ratio', ['MntWines', 'TotalMoneySpent']),
+        ('RatioFruits', 'ratio', ['MntFruits', 'TotalMoneySpent']),
+        ('RatioMeatProducts', 'ratio', ['MntMeatProducts', 'TotalMoneySpent']),
+        ('RatioFishProducts', 'ratio', ['MntFishProducts', 'TotalMoneySpent']),
+        ('RatioSweetProducts', 'ratio', ['MntSweetProducts', 'TotalMoneySpent']),
+        ('RatioGoldProducts', 'ratio', ['MntGoldProds', 'TotalMoneySpent']),
+        ('MoneyPerPurchase', 'ratio', ['TotalMoneySpent', 'Total_Purchases']),
+        # Income over 2 years and Effort Rate
+        ('Income2Years', 'product', ['Income', 2]),
+        ('EffortRate', 'ratio', ['TotalMoneySpent', 'Income2Years']),
+        ('TotalKids', 'sum', ['Teenhome', 'Kidhome']),
+        # People per Household and income per person
+        ('Count_Household', 'sum', ['Marital_Status_Divorced', 'Marital_Status_Single', 'TotalKids']),
+        ('Income_Per_Person', 'ratio', ['Income2Years', 'Count_Household']),
+    ]
+
+
+class FeatureBuilder:
+    """ Computes the derived features of a spec (see business_features) for a DataFrame or a batch of it
+
+        All features are written into one preallocated (records x features) block of dtype (float32 by default)
+        in a single pass over the spec: every operation writes straight into its column of the block and each
+        source column is converted once, so no intermediate Series are created. Infinite and missing results
+        are set to 0.
+
+    """
+
+    def __init__(self, spec, dtype=np.float32):
+        self.spec = list(spec)
+        for name, operation, operands in self.spec:
+            if operation not in OPERATIONS:
+                raise ValueError('Unknown operation {} for feature {}. Available: {}'.format(operation, name, OPERATIONS))
+        self.dtype = dtype
+
+    @property
+    def columns(self):
+        return [name for name, _, _ in self.spec]
+
+    def build(self, df):
+        """ The features of df as a DataFrame with the same index """
+        block = np.zeros((len(df), len(self.spec)), dtype=self.dtype, order='F')
+        values = {}
+
+        def operand(name):
+            if not isinstance(name, str):
+                return self.dtype(name)
+            if name not in values:
+                values[name] = np.asarray(df[name], dtype=self.dtype)
+            return values[name]
+
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            for j, (name, operation, operands) in enumerate(self.spec):
+                out = block[:, j]
+                first, rest = operand(operands[0]), [operand(other) for other in operands[1:]]
+                if operation == 'ratio':
+                    denominator = rest[0]
+                    np.divide(first, denominator, out=out, where=np.broadcast_to(denominator != 0, out.shape))
+                elif operation == 'difference':
+                    np.subtract(first, rest[0], out=out)
+                else:
+                    out[:] = first
+                    combine = np.add if operation == 'sum' else np.multiply
+                    for other in rest:
+                        combine(out, other, out=out)
+                values[name] = out
+        block[~np.isfinite(block)] = 0
+        return pd.DataFrame(block, index=df.index, columns=self.columns, copy=False)
+
+    def transform(self, df):
+        """ df with the features appended (replacing features with the same names) """
+        return pd.concat([df.drop(columns=[name for name in self.columns if name in df]), self.build(df)], axis=1)
@@ -0,0 +1,125 @@
+import os
+import json
+import hashlib
+import tempfile
+import pandas as pd
+
+
+CACHE_VERSION = 2
+
+
+def file_fingerprint(full_path, known=None, block_size=1 << 20):
+    """ Fingerprints a file by its size, modification time and content hash
+
+        Hashing the whole file is only needed when its size or mtime changed since the last
+        time it was seen, so a previously computed fingerprint can be passed in as known.
+
+    """
+    stat = os.stat(full_path)
+    fingerprint = {'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+    if known is not None and known.get('size') == fingerprint['size'] and known.get('mtime') == fingerprint['mtime']:
+        fingerprint['sha1'] = known['sha1']
+        return fingerprint
+    sha1 = hashlib.sha1()
+    with open(full_path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b''):
+            sha1.update(block)
+    fingerprint['sha1'] = sha1.hexdigest()
+    return fingerprint
+
+
+def frame_fingerprint(df):
+    """ Content hash of a DataFrame (values, index and column names) """
+    sha1 = hashlib.sha1()
+    sha1.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    sha1.update(json.dumps([str(c) for c in df.columns]).encode())
+    return sha1.hexdigest()
+
+
+class DatasetCache:
+    """ Content-addressed store of prepared datasets
+
+        Prepared frames are stored in the feather (Arrow) columnar format, which keeps dtypes
+        and categories and loads much faster than parsing the source workbook again. Entries
+        are addressed by the content hash of the source file plus the preparation parameters,
+        so editing the source file or changing the parameters never returns a stale frame.
+
+        Several processes (e.g. seeds and folds run in parallel) can share a cache: every write goes
+        to a temporary file of its own that atomically replaces the target, and an unreadable index
+        is treated as empty. Concurrent updates of the index can lose an entry, which is then just a
+        cache miss.
+
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self._index_path = os.path.join(cache_dir, 'index.json')
+
+    def _read_index(self):
+        try:
+            with open(self._index_path) as file:
+                index = json.load(file)
+            if isinstance(index, dict) and isinstance(index.get('files'), dict) \
+                    and isinstance(index.get('entries'), dict):
+                return index
+        except (OSError, ValueError):
+            pass
+        return {'files': {}, 'entries': {}}
+
+    def _temp_path(self, suffix):
+        fd, tmp_path = tempfile.mkstemp(suffix=suffix, dir=self.cache_dir)
+        os.close(fd)
+        return tmp_path
+
+    def _replace(self, write, path):
+        """ Writes path atomically: write(tmp_path) fills a temporary file that then replaces path """
+        tmp_path = self._temp_path(os.path.splitext(path)[1] + '.tmp')
+        try:
+            write(tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _write_index(self, index):
+        def write(tmp_path):
+            with open(tmp_path, 'w') as file:
+                json.dump(index, file)
+        self._replace(write, self._index_path)
+
+    def key(self, full_path, **params):
+        """ Builds the cache key of a source file prepared with the given parameters """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        index = self._read_index()
+        abs_path = os.path.abspath(full_path)
+        fingerprint = file_fingerprint(full_path, index['files'].get(abs_path))
+        if index['files'].get(abs_path) != fingerprint:
+            index['files'][abs_path] = fingerprint
+            self._write_index(index)
+        params['version'] = CACHE_VERSION
+        params['sha1'] = fingerprint['sha1']
+        return hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+
+    def load(self, key):
+        entry = self._read_index()['entries'].get(key)
+        path = os.path.join(self.cache_dir, key + '.feather')
+        if entry is None or not os.path.exists(path):
+            return None
+        df = pd.read_feather(path)
+        if entry['index'] is not None:
+            df.set_index(entry['index'], inplace=True)
+        return df
+
+    def meta(self, key):
+        """ Returns the metadata stored along with an entry (None if there is no such entry) """
+        entry = self._read_index()['entries'].get(key)
+        return None if entry is None else entry.get('meta')
+
+    def store(self, key, df, meta = None):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = os.path.join(self.cache_dir, key + '.feather')
+        index_name = df.index.name
+        self._replace(df.reset_index(drop=index_name is None).to_feather, path)
+        index = self._read_index()
+        index['entries'][key] = {'index': index_name, 'meta': meta}
+        self._write_index(index)
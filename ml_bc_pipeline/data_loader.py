@@ -1,7 +1,95 @@
+import os
 import sys
+import numpy as np
 import pandas as pd
-from datetime import datetime, date
-from sklearn.preprocessing import OneHotEncoder
+from datetime import date
+from ml_bc_pipeline.cache import DatasetCache
+from ml_bc_pipeline.encoding import CategoricalEncoder
+
+CACHE_DIR = '.dataset_cache'
+
+
+def to_datetime64(values):
+    """ Converts dates given as datetime64, yyyymmdd integers or yyyy-mm-dd / yyyymmdd strings to datetime64[D]
+
+        Integers are decomposed arithmetically and strings are parsed once per distinct value, so the
+        cost does not grow with the number of rows sharing the same date.
+
+    """
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.values.astype('datetime64[D]')
+    if pd.api.types.is_integer_dtype(values):
+        ymd = values.values.astype(np.int64)
+        months = (ymd // 10000 - 1970) * 12 + (ymd // 100 % 100 - 1)
+        return months.astype('datetime64[M]').astype('datetime64[D]') + (ymd % 100 - 1)
+    codes, uniques = pd.factorize(values)
+    parsed = pd.to_datetime(pd.Series(uniques).astype(str).str.replace('-', ''), format='%Y%m%d')
+    dates = parsed.values.astype('datetime64[D]')[codes]
+    dates[codes == -1] = np.datetime64('NaT')
+    return dates
+
+
+def days_since(values, reference_date):
+    """ Number of whole days between each date in values and reference_date """
+    reference_date = np.datetime64(pd.Timestamp(reference_date).date(), 'D')
+    dates = to_datetime64(values)
+    days = (reference_date - dates).astype(np.float64)
+    missing = np.isnat(dates)
+    if missing.any():
+        days[missing] = np.nan
+        return days
+    return days.astype(np.int64)
+
+
+def _smallest_int_dtype(min_, max_):
+    """ Smallest integer dtype holding every value between min_ and max_, None if none does """
+    candidates = [np.uint8, np.uint16, np.uint32, np.uint64] if min_ >= 0 else [np.int8, np.int16, np.int32, np.int64]
+    for dtype in candidates:
+        if np.iinfo(dtype).min <= min_ and max_ <= np.iinfo(dtype).max:
+            return dtype
+    return None
+
+
+def downcast_frame(df):
+    """ Downcasts every numerical column of df to the smallest dtype that holds its values exactly
+
+        Integer columns (and float columns without missing values holding only whole numbers) get the
+        smallest integer type fitting their range; other float columns become float32 when that does not
+        change any value. Categorical and object columns are left untouched.
+
+        Returns the downcast frame and a per column report of dtypes and memory (in bytes) before and after.
+
+    """
+    compact = {}
+    for column in df.columns:
+        values = df[column].values
+        dtype = values.dtype
+        if pd.api.types.is_bool_dtype(dtype) or not pd.api.types.is_numeric_dtype(dtype):
+            compact[column] = df[column]
+            continue
+        new_dtype = None
+        if values.size == 0:
+            new_dtype = dtype
+        elif pd.api.types.is_integer_dtype(dtype):
+            new_dtype = _smallest_int_dtype(values.min(), values.max()) or dtype
+        elif np.isfinite(values).all() and np.array_equal(values, np.round(values)):
+            # whole numbers beyond the int64 range stay floats
+            int64 = np.iinfo(np.int64)
+            if int64.min <= values.min() and values.max() < int64.max:
+                new_dtype = _smallest_int_dtype(values.min(), values.max())
+        if new_dtype is None:
+            roundtrip = values.astype(np.float32).astype(dtype)
+            if ((roundtrip == values) | (np.isnan(roundtrip) & np.isnan(values))).all():
+                new_dtype = np.float32
+            else:
+                new_dtype = dtype
+        compact[column] = df[column].astype(new_dtype)
+    compact = pd.DataFrame(compact, index=df.index, columns=df.columns)
+    report = pd.DataFrame({'dtype_before': df.dtypes.astype(str), 'dtype_after': compact.dtypes.astype(str),
+                           'bytes_before': df.memory_usage(index=False), 'bytes_after': compact.memory_usage(index=False)})
+    return compact, report
+
 
 class Dataset:
     """ Loads and prepares the data
@@ -9,42 +97,64 @@ class Dataset:
         The objective of this class is load the dataset and execute basic data
         preparation before effectively moving into the cross validation workflow.
 
+        Prepared data is cached (see ml_bc_pipeline.cache.DatasetCache) in a CACHE_DIR folder
+        next to the source file, so later runs on the same file skip the Excel parsing and the
+        preparation steps. Use cache = False to always rebuild from the source file.
+
+        Dt_Customer is encoded as the number of days until reference_date, which defaults to the
+        current date. Fix it to make repeated runs reproducible and the cache reusable across days.
+
+        Education and Marital_Status are one-hot encoded with a CategoricalEncoder. Without encoder, one
+        is fitted on this dataset and kept in self.encoder; pass the encoder of the training dataset when
+        loading unseen data so both get the same dummy columns.
+
+        With compact = True every column is downcast to the smallest dtype holding its values (see
+        downcast_frame), which makes the many copies done across seeds and folds cheaper. The memory
+        footprint of each column before and after is kept in self.memory_report.
+
     """
 
-    def __init__(self, full_path, unseen = False):
-        self.rm_df = pd.read_excel(full_path)
-        self.rm_df.set_index('ID',inplace=True)
-        self._drop_duplicates(full_path)
-        self._drop_metadata_features(unseen = unseen)
-        #self._drop_doubleback_features()
-        self._drop_unusual_classes()
-        #self._label_encoder()
-        #self._as_category()
-        self._days_since_customer(unseen = unseen)
-        self._generate_dummies()
-        print("Finnished loading data!")
+    features_to_enconde = ['Education', 'Marital_Status']
+
+    def __init__(self, full_path, unseen = False, cache = True, reference_date = None, encoder = None, compact = False):
+        self.reference_date = pd.Timestamp(date.today() if reference_date is None else reference_date).date()
+        self.encoder = encoder
+        self.rm_df = None
+        if cache:
+            store = DatasetCache(os.path.join(os.path.dirname(os.path.abspath(full_path)), CACHE_DIR))
+            key = store.key(full_path, unseen = unseen, ref_date = self.reference_date.isoformat(),
+                            encoder = None if encoder is None else encoder.to_dict())
+            self.rm_df = store.load(key)
+            if self.rm_df is not None:
+                self.encoder = CategoricalEncoder.from_dict(store.meta(key))
+                print("Loaded data from cache!")
+        if self.rm_df is None:
+            self.rm_df = pd.read_excel(full_path)
+            self.rm_df.set_index('ID',inplace=True)
+            self._drop_duplicates(full_path)
+            self._drop_metadata_features(unseen = unseen)
+            #self._drop_doubleback_features()
+            self._drop_unusual_classes()
+            #self._label_encoder()
+            #self._as_category()
+            self._days_since_customer(unseen = unseen)
+            self._generate_dummies()
+            if cache:
+                store.store(key, self.rm_df, meta = self.encoder.to_dict())
+            print("Finnished loading data!")
+        if compact:
+            self._downcast()
+
+    def _downcast(self):
+        self.rm_df, self.memory_report = downcast_frame(self.rm_df)
+        print(self.memory_report)
+        print("Memory usage: {} -> {} bytes".format(self.memory_report['bytes_before'].sum(),
+                                                    self.memory_report['bytes_after'].sum()))
 
     def _generate_dummies(self):
-        features_to_enconde = ['Education', 'Marital_Status']
-        columns = []
-        idxs = []
-        control = 0
-        for column in features_to_enconde:
-            for index in range(len(self.rm_df[column].unique()) - 1):
-                columns.append(column + '_' + self.rm_df[column].unique()[index])
-                idxs.append(control)
-                control = control + 1
-            control = control + 1
-        # encode categorical features from training data as a one-hot numeric array.
-        enc = OneHotEncoder(handle_unknown='ignore')
-
-        Xtr_enc = enc.fit_transform(self.rm_df[features_to_enconde].values).toarray()
-        # update training data
-        df_temp = pd.DataFrame(Xtr_enc[:,idxs], index=self.rm_df.index, columns=columns)
-        self.rm_df = pd.concat([self.rm_df, df_temp], axis=1)
-        for c in columns:
-            self.rm_df[c] = self.rm_df[c].astype('category')
-        self.rm_df.drop(features_to_enconde,axis=1,inplace = True)
+        if self.encoder is None:
+            self.encoder = CategoricalEncoder(self.features_to_enconde).fit(self.rm_df)
+        self.rm_df = self.encoder.transform(self.rm_df)
 
     def _drop_duplicates(self,full_path):
         print(self.rm_df.shape)
@@ -120,15 +230,78 @@ class Dataset:
 
             Similarly to the label encoder, we have to transform the Dt_Customer in order to feed numerical
             quantities into our ML algorithms. Here we encode Dt_Customer into number the of days since, for
-            example, the date when the data was extracted from the source - assume it was on 18/02/1993.
+            example, the date when the data was extracted from the source (self.reference_date).
+
+            The unseen workbook stores Dt_Customer as dates while the training one stores yyyy-mm-dd strings;
+            days_since handles both on datetime64 arrays, so the unseen flag is no longer needed here.
 
         """
-        if unseen:
-            self.rm_df['Dt_Customer'] = self.rm_df.Dt_Customer.apply(str)
-        self.rm_df.Dt_Customer = pd.to_datetime(self.rm_df['Dt_Customer'].str.replace('-', ''), format='%Y%m%d', errors='ignore')
-        ref_date = datetime.date(datetime.now())
-        if unseen:
-            self.rm_df['Dt_Customer'] = pd.to_datetime(self.rm_df.Dt_Customer)
-        ser = self.rm_df['Dt_Customer'].apply(func=datetime.date)
-        self.rm_df["Dt_Customer"] = ser.apply(func=lambda x: (ref_date - x).days)
+        self.rm_df["Dt_Customer"] = days_since(self.rm_df["Dt_Customer"], self.reference_date)
+
+
+class StreamingDataset(Dataset):
+    """ Loads and prepares CSV exports in fixed-size chunks
+
+        Streaming variant of Dataset for customer bases that do not fit in memory. Iterating over it
+        reads full_path chunksize rows at a time and yields each chunk after the same preparation steps
+        as Dataset: duplicates removal (across all chunks seen so far), metadata features and unusual
+        classes removal, Dt_Customer encoding and dummies generation.
+
+        Dummies need the same columns in every chunk, so they are generated by a fitted CategoricalEncoder,
+        e.g. the encoder of the training Dataset. If no encoder is given, it is fitted by a first pass over
+        the file that only reads the encoded features.
+
+        The header is read once up front. Exports that are already prepared (no Education and Marital_Status
+        columns, e.g. with Edu_* and mar_status_* dummies, or num_days_customer instead of Dt_Customer) are
+        streamed without the steps that need the raw columns. The index is the ID column, or the first column
+        when its header is blank, as in exports written with the index.
+
+    """
+
+    def __init__(self, full_path, chunksize = 100000, unseen = False, reference_date = None, encoder = None):
+        self.full_path = full_path
+        self.chunksize = chunksize
+        self.unseen = unseen
+        self.reference_date = pd.Timestamp(date.today() if reference_date is None else reference_date).date()
+        self.encoder = encoder
+        self.header = list(pd.read_csv(full_path, nrows=0).columns)
+        self.index_col = 'ID' if 'ID' in self.header else (0 if self.header and self.header[0].startswith('Unnamed:')
+                                                           else None)
+        missing = [feature for feature in self.features_to_enconde if feature not in self.header]
+        if missing and len(missing) < len(self.features_to_enconde):
+            raise ValueError('{} has some of the features to encode but not {}'.format(full_path, missing))
+        self.encoded = bool(missing)
+
+    def fit_encoder(self):
+        if self.encoded:
+            raise ValueError('{} has no {} columns to fit the encoder on'.format(self.full_path,
+                                                                                 self.features_to_enconde))
+        self.encoder = CategoricalEncoder(self.features_to_enconde)
+        for chunk in pd.read_csv(self.full_path, chunksize=self.chunksize, usecols=self.features_to_enconde):
+            self.rm_df = chunk
+            self._drop_unusual_classes()
+            self.encoder.partial_fit(self.rm_df)
+        return self.encoder
+
+    def __iter__(self):
+        if self.encoder is None and not self.encoded:
+            self.fit_encoder()
+        self._seen_rows = np.array([], dtype=np.uint64)
+        for chunk in pd.read_csv(self.full_path, chunksize=self.chunksize, index_col=self.index_col):
+            chunk.index.name = 'ID'
+            self.rm_df = chunk
+            self._drop_duplicates(self.full_path)
+            self._drop_metadata_features(unseen = self.unseen)
+            if not self.encoded:
+                self._drop_unusual_classes()
+            if 'Dt_Customer' in self.header:
+                self._days_since_customer(unseen = self.unseen)
+            if not self.encoded:
+                self._generate_dummies()
+            yield self.rm_df
 
+    def _drop_duplicates(self, full_path):
+        row_hashes = pd.util.hash_pandas_object(self.rm_df, index=False).values
+        duplicated = pd.Series(row_hashes).duplicated().values | np.isin(row_hashes, self._seen_rows)
+        self._seen_rows = np.union1d(self._seen_rows, row_hashes)
+        self.rm_df = self.rm_df[~duplicated]
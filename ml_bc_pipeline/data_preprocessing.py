@@ -1,28 +1,23 @@
 import sys
 import numpy as np
-from sklearn.impute import SimpleImputer
+from sklearn.model_selection import train_test_split
 import pandas as pd
-from scipy.stats import zscore,iqr
-from sklearn.ensemble import IsolationForest
+from scipy.stats import zscore
 from sklearn import metrics
 from scipy.stats import multivariate_normal
 from sklearn.metrics.pairwise import euclidean_distances
-import eif as iso
-from sklearn.cluster import DBSCAN
-from sklearn.covariance import EllipticEnvelope
-from sklearn.neighbors import LocalOutlierFactor
-import statsmodels.api as sm
-from sklearn import svm
-from scipy.spatial.distance import cdist
-from sklearn.preprocessing import MinMaxScaler
-from scipy.stats import norm, kstest
-from collections import defaultdict
-from collections import Counter
 from numpy.random import RandomState
-from imblearn.over_sampling import SMOTENC,SMOTE,ADASYN
 from sklearn.preprocessing import OneHotEncoder,PowerTransformer
-import seaborn as sb
 from sklearn.cluster import KMeans
+import joblib
+from ml_bc_pipeline.registry import OUTLIER_DETECTORS, PLOTTING
+from ml_bc_pipeline.outliers import boxplot_exceedance, rank_rows, flagged_variables, robust_z_scores, outlier_dict, \
+    iqr_bounds, winsorize, OutlierVotes, CoreSampleNovelty
+from ml_bc_pipeline.parallel import OutlierExecutor, score_in_chunks
+from ml_bc_pipeline.distances import mahalanobis_distances, cooks_distances
+from ml_bc_pipeline.imputation import BatchImputer
+from ml_bc_pipeline.utils import BlockScaler
+from ml_bc_pipeline.frames import FrameView, materialize
 
 
 class Processor:
@@ -37,40 +32,111 @@ class Processor:
     def __init__(self, training, unseen, seed):
         """ Constructor
 
-            It is worth to notice that both training and unseen are nothing more nothing less
-            than pointers, i.e., pr.training is DF_train and pr.unseen is DF_unseen yields True.
-            If you want them to be copies of respective objects, use .copy() on each parameter.
+            training and unseen (DataFrames or FrameViews, e.g. the folds of a DataFrame) are never
+            modified: they are read through FrameViews and the records that are kept are copied once,
+            when a preprocessing step first writes them, so there is no need to pass copies.
+
+            The preprocessing is fitted on training (see fit) and applied to unseen (see transform);
+            unseen can be None to only fit.
 
         """
-        self.training = training #.copy() to mantain a copy of the object
-        self.unseen = unseen #.copy() to mantain a copy of the object
-        self.report = []
         self.seed = seed
-        self.cat_vars = ['AcceptedCmp3', 'AcceptedCmp4', 'AcceptedCmp5','AcceptedCmp1', 'AcceptedCmp2', 'Complain'] +list(self.training.select_dtypes('category').columns)
-        #missing columns 'Income' 'num_days_customer'
-
+        self.report = []
+        self.unseen = unseen
         self.numerical_var = ['Dt_Customer','Income','Year_Birth', 'Kidhome', 'Teenhome',  'Recency', 'MntWines',
                          'MntFruits', 'MntMeatProducts', 'MntFishProducts',
                          'MntSweetProducts', 'MntGoldProds', 'NumDealsPurchases', 'NumWebPurchases',
                          'NumCatalogPurchases', 'NumStorePurchases',
                          'NumWebVisitsMonth', 'Response']
-        print("Before input:",self.training.shape,self.unseen.shape)
+        # fitted state, in the order the steps were fitted (see transform)
+        self.steps = []
+        self.scaler = None
+        self.imputer = None
+        self.power_transformer = None
+        self.power_columns = None
+        print("Before input:", training.shape, None if unseen is None else unseen.shape)
+
+        self.fit(training)
+        if unseen is not None:
+            self.unseen = self.transform(unseen)
+
+        print("Preprocessing complete!")
+
+    def fit(self, training):
+        """ Fits the preprocessing on training
+
+            Drops the records with missing values and the boxplot outliers from training and fits the
+            normalization on what is left; the preprocessed copy of training is kept in self.training.
+            Returns the Processor.
+
+        """
+        self.training = FrameView.of(training)
+        self.steps = []
+        dtypes = self.training.dtypes
+        self.cat_vars = ['AcceptedCmp3', 'AcceptedCmp4', 'AcceptedCmp5','AcceptedCmp1', 'AcceptedCmp2', 'Complain'] +list(dtypes[dtypes == 'category'].index)
+        #missing columns 'Income' 'num_days_customer'
 
         self._drop_missing_values()
         outliers = self._boxplot_outlier_detection()
-        self.training.drop(outliers,axis = 0,inplace = True)
+        self.training = self.training.drop(outliers)
 
-        #Normalization
+        #Normalization, the first step that writes: training is copied here
+        self.training = materialize(self.training)
         self._normalize()
+        return self
 
-        print("Preprocessing complete!")
+    def transform(self, batch, inplace=False, steps=None):
+        """ Applies the fitted preprocessing to a new batch of records (e.g. a new campaign)
+
+            The fitted steps (missing values, imputation, normalization and power transformation) are applied
+            in the order they were fitted, with the parameters learned on the training data, so nothing is
+            refitted; steps restricts them to a subset. Returns the preprocessed batch. The batch (a DataFrame
+            or a FrameView) is left untouched unless inplace=True: its remaining records are copied once, by the
+            first step that writes (the power transformation always builds a new frame).
+
+        """
+        if not inplace:
+            batch = FrameView.of(batch)
+        for step in self.steps if steps is None else steps:
+            if step == 'dropna':
+                if isinstance(batch, FrameView):
+                    batch = batch.dropna()
+                else:
+                    batch.dropna(inplace=True)
+                continue
+            batch = materialize(batch)
+            if step == 'impute':
+                self.imputer.transform(batch, inplace=True)
+            elif step == 'normalize':
+                self.scaler.transform(batch, inplace=True)
+            elif step == 'power':
+                transformed = pd.DataFrame(self.power_transformer.transform(batch[self.power_columns]),
+                                           index=batch.index, columns=self.power_columns)
+                for col in batch.select_dtypes(include='category'):
+                    transformed[col] = batch[col]
+                batch = transformed
+        return materialize(batch)
+
+    def save(self, path):
+        """ Saves the fitted state (not the data) to path, see load """
+        state = {key: value for key, value in self.__dict__.items() if key not in ('training', 'unseen')}
+        joblib.dump(state, path)
+
+    @classmethod
+    def load(cls, path):
+        """ Loads a Processor saved with save, ready to transform new batches """
+        processor = cls.__new__(cls)
+        processor.__dict__.update(joblib.load(path))
+        processor.training = None
+        processor.unseen = None
+        return processor
 
 
     #DEALING WITH MISSING VALUES
     def _drop_missing_values(self):
         self.report.append('_drop_missing_values')
-        self.training.dropna(inplace=True)
-        self.unseen.dropna(inplace=True)
+        self.steps.append('dropna')
+        self.training = self.training.dropna()
 
     def convert_numeric_labelling(self,var):
         temp = self.training[var].dropna().copy()
@@ -88,36 +154,14 @@ class Processor:
         self.training[var] = self.training[var].apply(lambda x: cat_dict[x] if x in cat_dict.keys() else None)
 
     def _impute_missing_values(self):
+        '''Fills the missing values of training and unseen with the mean, median or mode learned on training (see
+        ml_bc_pipeline.imputation.BatchImputer)'''
         self.report.append('_impute_missing_values')
-        for column in self.training[self.numerical_var]:
-            data = self.training[column]
-            loc, scale = norm.fit(data)
-            n = norm(loc = loc, scale = scale)
-            _, p_value = kstest(self.training[column].values, n.cdf)
-            if p_value > 0.05:
-                self._imputer = SimpleImputer(missing_values=np.nan, strategy='mean')
-                self.training[column] = self._imputer.fit_transform(self.training[column].values.reshape(-1,1))
-                self.unseen[column] = self._imputer.transform(self.unseen[column].values.reshape(-1,1))
-            else:
-                self._imputer = SimpleImputer(missing_values=np.nan, strategy='median')
-                self.training[column] = self._imputer.fit_transform(self.training[column].values.reshape(-1,1))
-                self.unseen[column] = self._imputer.transform(self.unseen[column].values.reshape(-1,1))
-        for var in self.cat_vars:
-
-            var_dict = self.convert_numeric_labelling(var)
-            self.training[var] = self.training[var].astype(int)
-            self.unseen[var] = self.unseen[var].astype(int)
-            self._imputer = SimpleImputer(missing_values=np.nan, strategy='most_frequent')
-            self.training[var] = self._imputer.fit_transform(self.training[var].values.reshape(-1,1))
-            self.unseen[var] = self._imputer.transform(self.unseen[var].values.reshape(-1,1))
-
-            self.training[var] = self.training[var].astype('category')
-            self.unseen[var] = self.unseen[var].astype('category')
-
-            self.revert_numeric_labelling(var,var_dict)
-        self.training[self.cat_vars] =self.training[self.cat_vars].astype('category')
-
-        self.unseen[self.cat_vars] = self.unseen[self.cat_vars].astype('category')
+        self.steps.append('impute')
+        self.imputer = BatchImputer(self.numerical_var, self.cat_vars).fit(self.training)
+        self.imputer.transform(self.training, inplace=True)
+        if self.unseen is not None:
+            self.unseen = self.transform(self.unseen, inplace=True, steps=['impute'])
     # DEALING WITH OUTLIERS
     ### UNIVARIATE OUTLIER DETECTION
     def _filter_df_by_std(self):
@@ -202,128 +246,94 @@ class Processor:
         return z_score_outliers
 
     def _boxplot_outlier_detection(self, percent = 0.03, treshold=1.5, ranking = False):
+        """ Ranks the records by how far they fall beyond the boxplot whiskers of the z-scored numerical variables
+
+            The distance of every record is its largest exceedance over all numerical variables, computed
+            for the whole matrix at once (see ml_bc_pipeline.outliers.boxplot_exceedance). Returns the ids of
+            the percent most distant records or, with ranking = True, a dict with the variables where each
+            outlier was found, both sorted in descending order of distance.
+
+        """
         self.report.append('_boxplot_outlier_detection')
-        box_plot_outliers = []
-        #For each var check ouytliers and their distance
-        for var in self.numerical_var:
-            if var != 'Response':
-                df = pd.Series(zscore(self.training[var].copy()))
-                df.index = self.training.index.copy()
-                iqr_ = iqr(df)
-                Q1 = np.percentile(df, 25)
-                Q3 = np.percentile(df, 75)
-                ix1 = df.index[np.where(df.values > (Q3 + treshold * iqr_))[0]]
-                indexes = list(zip(ix1, [var] * len(ix1), df.ix[ix1].values - (Q3 + treshold * iqr_)))
-                ix2 = df.index[np.where(df.values < (Q1 - treshold * iqr_))[0]]
-                indexes2 = list(zip(ix2, [var] * len(ix2), np.abs((df.ix[ix2].values + (Q1 - treshold * iqr_)))))
-                indexes = indexes + indexes2
-                box_plot_outliers = box_plot_outliers + indexes
-
-        #Sort outliers in descending order by their distance
-        box_plot_outliers.sort(key = lambda x: x[2],reverse = True)
+        variables = [var for var in self.numerical_var if var != 'Response']
+        exceedance = boxplot_exceedance(self.training[variables].values, treshold)
+        #Sort outliers in descending order by their distance, each id appears once with its highest distance
+        rows = rank_rows(exceedance)
         if ranking:
-            box_plot_outliers = [(item[0],item[1]) for item in box_plot_outliers]
-            outlier_dict = {}
-            for item in box_plot_outliers:
-                if item[0] in outlier_dict.keys():
-                    outlier_dict[item[0]] = list(outlier_dict[item[0]]) + list([item[1]])
-                else:
-                    outlier_dict[item[0]] = [item[1]]
-            return outlier_dict
-        #Delete repeating ids, leave the ones with the highest distance
-        to_delete = []
-        for x in range(len(box_plot_outliers)):
-            a = box_plot_outliers[x]
-            for y in range(1,len(box_plot_outliers)):
-                b = box_plot_outliers[y]
-                if a[0] == b[0]:
-                    if a[1] > b[1]:
-                        to_delete.append(b)
-                    else:
-                        to_delete.append(a)
-        box_plot_outliers = np.array(box_plot_outliers)
-        for x in range(len(box_plot_outliers)-1,-1):
-            del box_plot_outliers[x]
+            return dict(zip(self.training.index[rows], flagged_variables(exceedance, rows, variables)))
         n = int(self.training.shape[0] * percent)
-        return [int(x[0]) for x in box_plot_outliers[:n]]
+        return self.training.index[rows[:n]].tolist()
 
-    def robust_z_score_method(self, treshold=5):
-        self.report.append('robust_z_score_method')
-        
-        robust_zs_outliers = {}
-        df = self.training[self.numerical_var]
-        size = len(df)
-        for var in self.numerical_var:
-            if var != 'Response':
-                ds = pd.Series(df[var])
-                ds.index = df.index
-                median = np.median(ds)
-                MAD = np.median([np.abs(ds.iloc[i] - median) for i in range(size)])
-                modified_z_scores = pd.Series([0.6745 * (ds.iloc[i] - median) / MAD for i in range(size)])
-                modified_z_scores.index = ds.index
-
-                for ind in modified_z_scores[np.abs(modified_z_scores) > treshold].index:
-                    try:
-                        robust_zs_outliers[ind] = robust_zs_outliers[ind] + ' ' + var
-                    except:
-                        robust_zs_outliers[ind] = var
+    def robust_z_score_mask(self, treshold=5, dtype=np.float64):
+        """ Outlier mask (records x numerical variables) of the modified z-score method
+
+            Medians and MADs of all numerical variables are computed at once; dtype=np.float32 runs the
+            computation in single precision.
 
-        for key in robust_zs_outliers.keys(): robust_zs_outliers[key] = robust_zs_outliers[key].split(' ')
-        return robust_zs_outliers
+        """
+        variables = [var for var in self.numerical_var if var != 'Response']
+        modified_z_scores = robust_z_scores(self.training[variables].values, dtype)
+        return pd.DataFrame(np.abs(modified_z_scores) > treshold, index=self.training.index, columns=variables)
+
+    def robust_z_score_method(self, treshold=5, dtype=np.float64):
+        self.report.append('robust_z_score_method')
+        mask = self.robust_z_score_mask(treshold, dtype)
+        return outlier_dict(mask.values, mask.index, mask.columns)
 
     #### MULTIVARIATE OUTLIER DETECTION
     """ CONTAMINATION: The amount of contamination of the data set, i.e. the proportion of outliers in the data set. 
     Used when fitting to define the threshold on the decision function. """
 
-    def isolation_forest(self, contamination, seed):
+    def isolation_forest(self, contamination, seed, chunksize=100000, n_jobs=None):
+        """ Isolation forest, scored in parallel chunks of chunksize records (see ml_bc_pipeline.parallel) """
         self.report.append('isolation_forest')
-        clf = IsolationForest(max_samples=100, contamination=contamination, random_state=seed)
-        clf.fit(self.training)
-        outliers_isoflorest = clf.predict(self.training)
-        outliers_isoflorest = pd.Series(outliers_isoflorest)
-        outliers_isoflorest.index = self.training.index
-        return np.array(outliers_isoflorest[outliers_isoflorest == -1].index)
-
-    def uni_boxplot_outlier_det(self,series_):
-        outliers = []
-        Q1 = np.percentile(series_, 25)
-        Q3 = np.percentile(series_, 75)
-        for record in series_.index:
-            if series_[series_.index == record].iloc[0] > (Q3 + 1.5 * iqr(series_)) or series_[series_.index == record].iloc[
-                0] < (Q1 - 1.5 * iqr(series_)):
-                outliers.append(record)
-        return outliers
-
-    def extended_isolation_forest(self,contamination):
+        # the trees work in float32, converting once avoids a float64 copy and a second conversion per chunk
+        X = self.training.astype(np.float32).values
+        clf = OUTLIER_DETECTORS['isolation_forest'](max_samples=100, contamination=contamination, random_state=seed)
+        clf.fit(X)
+        outliers_isoflorest = score_in_chunks(clf.predict, X, chunksize, n_jobs)
+        return np.array(self.training.index[outliers_isoflorest == -1])
+
+    def uni_boxplot_outlier_det(self, series_, treshold=1.5):
+        """ Ids of the values of series_ outside its boxplot whiskers, in the order of series_
+
+            Quartiles are computed once (see ml_bc_pipeline.outliers.iqr_bounds) and every value is compared
+            in one vectorized pass. Shared by extended_isolation_forest and cooks_distance_outlier.
+
+        """
+        values = np.asarray(series_.values, dtype=np.float64)
+        lower, upper = iqr_bounds(values, treshold)
+        return series_.index[(values > upper) | (values < lower)].tolist()
+
+    def extended_isolation_forest(self, contamination, ntrees=100, sample_size=256, chunksize=100000, n_jobs=None):
+        """ Extended isolation forest, scored in parallel chunks of chunksize records (see ml_bc_pipeline.parallel)
 
+            Each tree only sees sample_size records, so the forest is built from a random subset of at most
+            ntrees * sample_size records instead of a float64 copy of the whole training set.
+
+        """
         self.report.append('extended_isolation_forest')
-        if_eif = iso.iForest(self.training.astype('float64').values, ntrees=100, sample_size=256, ExtensionLevel=2)
-        anomaly_scores = if_eif.compute_paths(X_in=self.training.values)
+        X = self.training.astype(np.float32).values
+        n_fit = min(X.shape[0], ntrees * sample_size)
+        fit_rows = np.random.RandomState(self.seed).choice(X.shape[0], n_fit, replace=False)
+        if_eif = OUTLIER_DETECTORS['extended_isolation_forest'](X[fit_rows].astype('float64'), ntrees=ntrees,
+                                                                sample_size=min(sample_size, n_fit), ExtensionLevel=2)
+        anomaly_scores = score_in_chunks(if_eif.compute_paths, X, chunksize, n_jobs)
         anomaly_scores = pd.Series(anomaly_scores)
         anomaly_scores.index = self.training.index
         return self.uni_boxplot_outlier_det(anomaly_scores)
 
     # Getting the columns (variables) means
-    def mahalanobis_distance_outlier(self):
+    def mahalanobis_distance_outlier(self, chunksize=100000):
+        """ Mahalanobis distance detector
+
+            Distances are computed in closed form from a QR factorization of the centered data, chunksize
+            records at a time (see ml_bc_pipeline.distances.mahalanobis_distances).
+
+        """
         self.report.append('mahalanobis_distance_outlier')
-        ds = self.training.copy()[self.numerical_var]
-        #ds[self.cat_vars] = ds[self.cat_vars].astype(float)
-        var_means = ds.mean(axis=0).values.reshape(1, -1)
-        # Getting the inverse of the covariance matrix
-        try:
-            inv_cov_matrix = np.linalg.inv(np.cov(ds.T))
-        except:
-            m = np.cov(ds.T)
-            i = np.eye(m.shape[0], m.shape[1])
-            inv_cov_matrix = np.linalg.lstsq(m, i)[0]
-        try:
-            np.linalg.cholesky(inv_cov_matrix)
-            print("all good")
-        except:
-            print("WARNING, mahalanobis no good..")
-            # REVER ISTO...
-        MDs = cdist(var_means, ds, 'mahalanobis', VI=inv_cov_matrix)
-        MDs = pd.Series([distance for sublist in MDs for distance in sublist], index=ds.index)
+        ds = self.training[self.numerical_var]
+        MDs = pd.Series(mahalanobis_distances(ds.values, chunksize), index=ds.index)
 
         def find_outliers(MDs, percent = 0.03):
             treshold = 3
@@ -340,14 +350,38 @@ class Processor:
             return t_outliers.index[:n]
         return find_outliers(MDs)
 
-    def dbscan_outlier_detection(self, minpoints=None, radius=None):
+    def _fit_sample_score_all(self, estimator, ds, sample_size, chunksize, n_jobs):
+        """ Fits estimator on a subsample of sample_size records, stratified by Response, and scores all of ds
+
+            Scoring is novelty-style (estimator.predict) over chunks of chunksize records in n_jobs worker
+            processes (see ml_bc_pipeline.parallel.score_in_chunks), so the fit cost is bounded by sample_size.
+            Returns the ids predicted as outliers (-1).
+
+        """
+        stratify = ds['Response'] if 'Response' in ds else None
+        sample, _ = train_test_split(ds, train_size=sample_size, stratify=stratify, random_state=self.seed)
+        estimator.fit(sample.values)
+        scorer = CoreSampleNovelty(estimator).predict if hasattr(estimator, 'components_') else estimator.predict
+        predictions = score_in_chunks(scorer, ds.values, chunksize, n_jobs)
+        return ds.index[predictions == -1]
+
+    # With sample_size (number of records) the detectors below are fitted on a stratified subsample and score
+    # the full dataset in parallel chunks instead of being fitted on all records.
+
+    def dbscan_outlier_detection(self, minpoints=None, radius=None, sample_size=None, chunksize=100000, n_jobs=None):
         self.report.append('dbscan_outlier_detection')
         ds = self.training[self.numerical_var]
-        outlier_detection = DBSCAN(
+        sampled = sample_size is not None and sample_size < ds.shape[0]
+        if sampled and minpoints is not None:
+            # keep the density threshold: a subsample has proportionally fewer neighbours within radius
+            minpoints = max(2, int(round(minpoints * sample_size / ds.shape[0])))
+        outlier_detection = OUTLIER_DETECTORS['dbscan'](
             eps=radius,
             metric="euclidean",
             min_samples=minpoints,
-            n_jobs=-1)
+            n_jobs=-1 if n_jobs is None else n_jobs)
+        if sampled:
+            return self._fit_sample_score_all(outlier_detection, ds, sample_size, chunksize, n_jobs)
 
         clusters = outlier_detection.fit_predict(ds)
         # Seing the number of identified noise (outliers)
@@ -356,121 +390,85 @@ class Processor:
         clusters.index = ds.index
         return clusters[clusters == -1].index
 
-    def elliptic_envelope_out(self, contamination):
+    def elliptic_envelope_out(self, contamination, sample_size=None, chunksize=100000, n_jobs=None):
         self.report.append('elliptic_envelope_out')
         ds = self.training[self.numerical_var]
-        elliptic = EllipticEnvelope(contamination=contamination)
+        elliptic = OUTLIER_DETECTORS['elliptic_envelope'](contamination=contamination)
+        if sample_size is not None and sample_size < ds.shape[0]:
+            return self._fit_sample_score_all(elliptic, ds, sample_size, chunksize, n_jobs)
         elliptic.fit(ds)
         results = elliptic.predict(ds)
         outlier_elliptic = pd.Series(results)
         outlier_elliptic.index = ds.index
         return outlier_elliptic[outlier_elliptic == -1].index
 
-    def local_outlier_factor(self, n_neighbors = None, contamination = None):
+    def local_outlier_factor(self, n_neighbors = None, contamination = None, sample_size=None, chunksize=100000,
+                             n_jobs=None):
         self.report.append('local_outlier_factor')
         ds = self.training[self.numerical_var]
-        lof = LocalOutlierFactor(n_neighbors=n_neighbors, contamination=contamination)
+        if sample_size is not None and sample_size < ds.shape[0]:
+            lof = OUTLIER_DETECTORS['local_outlier_factor'](n_neighbors=n_neighbors, contamination=contamination,
+                                                            novelty=True)
+            return self._fit_sample_score_all(lof, ds, sample_size, chunksize, n_jobs)
+        lof = OUTLIER_DETECTORS['local_outlier_factor'](n_neighbors=n_neighbors, contamination=contamination)
         outiler_lof = lof.fit_predict(ds)
         outiler_lof = pd.Series(outiler_lof)
         outiler_lof.index = ds.index
         return outiler_lof[outiler_lof == -1].index
 
-    def one_class_svm(self):
+    def one_class_svm(self, sample_size=None, chunksize=100000, n_jobs=None):
 
         self.report.append('one_class_svm')
         ds = self.training[self.numerical_var]
-        oneclasssvm = svm.OneClassSVM()
+        oneclasssvm = OUTLIER_DETECTORS['one_class_svm']()
+        if sample_size is not None and sample_size < ds.shape[0]:
+            return self._fit_sample_score_all(oneclasssvm, ds, sample_size, chunksize, n_jobs)
         oneclasssvm_outliers = oneclasssvm.fit_predict(ds)
-        oneclasssvm_outliers = pd.DataFrame(oneclasssvm_outliers, index = ds.index)
+        oneclasssvm_outliers = pd.Series(oneclasssvm_outliers, index = ds.index)
         return oneclasssvm_outliers[oneclasssvm_outliers == -1].index
 
-    def cooks_distance_outlier(self, vd):
+    def cooks_distance_outlier(self, vd, chunksize=100000):
+        """ Cook's distance detector, for the least squares regression of vd on the other variables
+
+            Distances are computed in closed form, chunksize records at a time (see
+            ml_bc_pipeline.distances.cooks_distances).
+
+        """
         self.report.append('cooks_distance_outlier')
         df = self.training
-        X = df[vd].astype('float64').values
-        Y = df.drop(columns=vd).astype('float64').values
-        m = sm.OLS(X, Y).fit()
-        infl = m.get_influence()
-        sm_fr = infl.summary_frame()
-        return self.uni_boxplot_outlier_det(sm_fr['cooks_d'].sort_values(ascending=False))
+        cooks_d = cooks_distances(df.drop(columns=vd).values, df[vd].astype('float64').values, chunksize)
+        return self.uni_boxplot_outlier_det(pd.Series(cooks_d, index=df.index).sort_values(ascending=False))
 
     def uni_iqr_outlier_smoothing(self,DOAGO_results, ds):
-        '''use the info gatheres from the previous function (decide on and get outliers) and smoothes the detected outliers.'''
+        '''use the info gatheres from the previous function (decide on and get outliers) and smoothes the detected outliers
+        (see ml_bc_pipeline.outliers.winsorize).'''
         self.report.append('uni_iqr_outlier_smoothing')
-        novo_ds = ds.copy()
-        print(DOAGO_results)
-        for key in DOAGO_results.keys():
-            print(key)
-            for var in DOAGO_results[key]:
-                print(var)
-                if var != 'multi/unknown':
-                    if ds[var][ds.index == key].values > np.mean(ds[var]):
-                        novo_ds[var][novo_ds.index == key] = np.percentile(ds[var], 75) + 1.5 * iqr(ds[var])
-
-                    else:
-                        novo_ds[var][novo_ds.index == key] = np.percentile(ds[var], 25) - 1.5 * iqr(ds[var])
-                else: novo_ds=novo_ds[novo_ds.index!=key]
-
-        return novo_ds
+        return winsorize(ds, DOAGO_results)
 
     def outlier_rank(self,smoothing,treshold,*arg):
-        '''this function returns two things. First, the number of times each row appears as outlier. The second is the full dictionary with the indexes and the columns where they
-        appear as outliers.
+        '''Votes the results of several outlier detectors (see ml_bc_pipeline.outliers.OutlierVotes) and removes, or
+        smoothes, the records whose min-max scaled number of votes is above treshold. Returns the votes, which give the
+        ranked outliers and the variables where each one was flagged.
         '''
         self.report.append('outlier_rank')
-        IDS = []
-        ids = []
-        keys = []
-        for array in arg:
-            if isinstance(array, dict):
-                for key in array.keys():
-                    keys.extend([key for _ in range(len(array[key]))])
-            else:
-                if (len(np.array(array).shape)) < 2:
-                    ids.extend([id_ for id_ in array])
-                else:
-                    IDS.extend([id_ for sublist in array for id_ in sublist])
-
-        full = IDS + keys + ids
-        counts = np.array([full.count(i) for i in full]).reshape(-1,1)
-        scaler = MinMaxScaler()
-        scaler.fit(counts)
-        counts=scaler.transform(counts)
-        counts=[item for sublist in counts for item in sublist]
-        pass_for_full = [thing for thing in arg]
-
-        def get_full_outlier_dict(full_dict):
-            dd = defaultdict(list)
-            [print(arg_) for arg_ in full_dict]
-            for d in ([arg_ for arg_ in full_dict]):
-                if isinstance(d,dict):
-                    for key, value in d.items():
-                        dd[key].append(value)
-
-                else:
-                    for id in d:
-                        dd[id]=[['multi/unknown']]
-            dd = dict(dd)
-
-            for key in dd.keys():
-                # flattning the values of the dicts
-                dd[key] = [item for sublist in dd[key] for item in sublist]
-                # removing the duplicated variables where a key is outlier
-                dd[key] = list(dict.fromkeys(dd[key]))
-            return dd
-
-        outlier_info_dict = get_full_outlier_dict(pass_for_full)
-        counts=dict(sorted(dict(zip(full, counts)).items(), key=lambda x: x[1], reverse=True))
-        outliers=list({key for (key, value) in counts.items() if value > treshold})
+        votes = OutlierVotes(self.training.index)
+        for result in arg:
+            votes.add(result)
+        outliers = votes.select(treshold)
 
         if smoothing:
             self.report.append('uni_iqr_rank_outlier_smoothing')
-            outlier_info = dict([(k, v) for (k, v) in outlier_info_dict.items() if k in outliers])
-            print(outlier_info)
-            self.training=self.uni_iqr_outlier_smoothing(outlier_info,self.training)
+            self.training=self.uni_iqr_outlier_smoothing(votes.provenance(outliers),self.training)
 
         else:
             self.training=self.training[~self.training.index.isin(outliers)]
+        return votes
+
+    def parallel_outlier_rank(self, smoothing, treshold, detectors, n_jobs=None):
+        '''Runs the multivariate detectors given as {method name: keyword arguments} in parallel (see
+        ml_bc_pipeline.parallel.OutlierExecutor) and feeds their results to outlier_rank.
+        '''
+        return OutlierExecutor(self, n_jobs).rank(detectors, smoothing, treshold)
 
     def decide_on_and_get_outliers(self,outlier_rank_result, treshold):
         '''pass the ranking here and choose the records that appear more than  treshold times to be our outliers'''
@@ -480,21 +478,20 @@ class Processor:
 
     def power_transformation(self):
         pt=PowerTransformer()
-        pt.fit(self.training.select_dtypes(exclude='category'))
-        temp = pd.DataFrame(pt.transform(self.training.select_dtypes(exclude='category')))
-        temp.index=self.training.select_dtypes(exclude='category').index
-        temp.columns=self.training.select_dtypes(exclude='category').columns
+        self.power_columns = list(self.training.select_dtypes(exclude='category').columns)
+        pt.fit(self.training[self.power_columns])
+        self.power_transformer = pt
+        temp = pd.DataFrame(pt.transform(self.training[self.power_columns]))
+        temp.index=self.training.index
+        temp.columns=self.power_columns
         for col in self.training.select_dtypes(include='category'):
             temp[col]=self.training[col]
         self.training=temp
         del temp
-        temp=pd.DataFrame(pt.transform(self.unseen.select_dtypes(exclude='category')))
-        temp.index = self.unseen.select_dtypes(exclude='category').index
-        temp.columns = self.unseen.select_dtypes(exclude='category').columns
-        for col in self.unseen.select_dtypes(include='category'):
-            temp[col]=self.unseen[col]
-        self.unseen=temp
-        print(temp)
+        self.steps.append('power')
+        if self.unseen is not None:
+            self.unseen = self.transform(self.unseen, steps=['power'])
+            print(self.unseen)
 
 
         def get_k_means_elbow_graph(ds, numerical, min_clust, max_clust):
@@ -502,7 +499,7 @@ class Processor:
             for i in range(min_clust, max_clust):
                 kmeans = KMeans(n_clusters=i).fit(self.training.select_dtypes(exclude='category'))
                 km = km.append({'num_clusters': i, 'inertia': kmeans.inertia_}, ignore_index=True)
-            sb.lineplot(x=km['num_clusters'], y=km['inertia'])
+            PLOTTING['seaborn'].lineplot(x=km['num_clusters'], y=km['inertia'])
             return
 
 
@@ -510,21 +507,10 @@ class Processor:
 
     ### NORMALIZATION
     def _normalize(self):
-        print(self.training.shape,self.unseen.shape)
+        '''Min-max scales the continuous variables of training in place, as a float32 block (see
+        ml_bc_pipeline.utils.BlockScaler)'''
         self.report.append('_normalize')
-        dummies = list(self.training.select_dtypes(include=["category", "object"]).columns)
-        dummies.append('Response')
-        print(self.training.columns[~self.training.columns.isin(dummies)])
-        print(self.unseen.columns[~self.unseen.columns.isin(dummies)])
-        scaler = MinMaxScaler()
-        print('normalize', self.training.shape)
-        scaler.fit(self.training[self.training.columns[~self.training.columns.isin(dummies)]].values)
-        self.training[self.training.columns[~self.training.columns.isin(dummies)]] = pd.DataFrame(
-            scaler.transform(self.training[self.training.columns[~self.training.columns.isin(dummies)]].values),
-            columns=self.training[self.training.columns[~self.training.columns.isin(dummies)]].columns,
-            index=self.training[self.training.columns[~self.training.columns.isin(dummies)]].index)
-        print('normalize',self.unseen.shape)
-        self.unseen[self.unseen.columns[~self.unseen.columns.isin(dummies)]] = pd.DataFrame(
-            scaler.transform(self.unseen[self.unseen.columns[~self.unseen.columns.isin(dummies)]].values),
-            columns=self.unseen[self.unseen.columns[~self.unseen.columns.isin(dummies)]].columns,
-            index=self.unseen[self.unseen.columns[~self.unseen.columns.isin(dummies)]].index)
\ No newline at end of file
+        self.scaler = BlockScaler(BlockScaler.continuous_columns(self.training))
+        print('normalize', self.training.shape, self.scaler.columns)
+        self.scaler.fit_transform(self.training, inplace=True)
+        self.steps.append('normalize')
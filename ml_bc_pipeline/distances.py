@@ -0,0 +1,98 @@
+import numpy as np
+from scipy.linalg import solve_triangular
+
+
+def _chunks(n, chunksize):
+    return [slice(start, min(start + chunksize, n)) for start in range(0, n, chunksize)]
+
+
+def _full_rank(R):
+    diagonal = np.abs(np.diag(R))
+    return diagonal.size > 0 and diagonal.min() > diagonal.max() * max(R.shape) * np.finfo(R.dtype).eps
+
+
+def tsqr(blocks, n_columns):
+    """ R factor of the QR decomposition of the matrix made of the row blocks yielded by blocks
+
+        Tall-skinny QR: the R factor of each block is stacked under the running R factor and the small
+        stack is factorized again, so only one block is held at any time.
+
+    """
+    R = np.zeros((0, n_columns))
+    for block in blocks:
+        R = np.linalg.qr(np.vstack([R, block]), mode='r')
+    return R
+
+
+class TriangularSolver:
+    """ Solves x R^-1 for the rows x of a matrix, given the upper triangular R factor of a QR decomposition
+
+        Triangular solves are used while R is well conditioned; when it is (numerically) singular the
+        pseudo-inverse of R is used instead, which gives the minimum norm solution.
+
+    """
+
+    def __init__(self, R):
+        self.R = R
+        self.full_rank = _full_rank(R)
+        self.rank = R.shape[1] if self.full_rank else np.linalg.matrix_rank(R)
+        self.R_pinv = None if self.full_rank else np.linalg.pinv(R)
+
+    def solve(self, block):
+        if self.full_rank:
+            return solve_triangular(self.R, block.T, trans='T', lower=False, check_finite=False).T
+        return block @ self.R_pinv
+
+    def coefficients(self, z):
+        """ Solves R b = z """
+        if self.full_rank:
+            return solve_triangular(self.R, z, lower=False, check_finite=False)
+        return self.R_pinv @ z
+
+
+def mahalanobis_distances(X, chunksize=100000):
+    """ Mahalanobis distance of each row of X to the mean of X, for the sample covariance of X
+
+        The covariance is never formed nor inverted: with the R factor of the centered data,
+        cov = R'R / (n - 1), so the distance of a row x is sqrt(n - 1) * ||(x - mean) R^-1||,
+        solved for chunks of chunksize rows at a time.
+
+    """
+    n = X.shape[0]
+    mean = np.zeros(X.shape[1])
+    for rows in _chunks(n, chunksize):
+        mean += np.asarray(X[rows], dtype=np.float64).sum(axis=0)
+    mean /= n
+    centered = (np.asarray(X[rows], dtype=np.float64) - mean for rows in _chunks(n, chunksize))
+    solver = TriangularSolver(tsqr(centered, X.shape[1]))
+    distances = np.empty(n)
+    for rows in _chunks(n, chunksize):
+        whitened = solver.solve(np.asarray(X[rows], dtype=np.float64) - mean)
+        distances[rows] = np.sqrt(np.einsum('ij,ij->i', whitened, whitened) * (n - 1))
+    return distances
+
+
+def cooks_distances(X, y, chunksize=100000):
+    """ Cook's distance of each observation of the least squares regression of y on X (no intercept)
+
+        [X | y] is factorized once (see tsqr): the coefficients come from its R factor and the leverage of a
+        row x is ||x R^-1||^2 for the X block of R. Residuals and leverages are then computed chunk by chunk,
+        with d = e^2 / (k * s^2) * h / (1 - h)^2, k the number of regressors and s^2 = SSR / (n - rank).
+
+    """
+    n, k = X.shape
+    y = np.asarray(y, dtype=np.float64).reshape(-1)
+    R = tsqr((np.column_stack([np.asarray(X[rows], dtype=np.float64), y[rows]]) for rows in _chunks(n, chunksize)),
+             k + 1)
+    solver = TriangularSolver(R[:k, :k])
+    beta = solver.coefficients(R[:k, k])
+    residuals = np.empty(n)
+    leverage = np.empty(n)
+    for rows in _chunks(n, chunksize):
+        block = np.asarray(X[rows], dtype=np.float64)
+        residuals[rows] = y[rows] - block @ beta
+        projected = solver.solve(block)
+        leverage[rows] = np.einsum('ij,ij->i', projected, projected)
+    scale = residuals @ residuals / (n - solver.rank)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return residuals ** 2 / (k * scale) * leverage / (1 - leverage) ** 2
@@ -0,0 +1,68 @@
+import json
+import numpy as np
+import pandas as pd
+
+
+class CategoricalEncoder:
+    """ Fitted one-hot encoding schema
+
+        Stores the categories of each encoded feature, fitted once on training data, and applies them
+        to any later batch (unseen data, streamed chunks) so that every batch gets exactly the same dummy
+        columns. As the original dummies generation, one dummy is created per category except the last
+        one of each feature; categories not seen during fit are encoded as all zeros.
+
+        The dummies of all features are written in a single pass into one preallocated uint8 block and
+        returned as category columns (1 byte per value).
+
+    """
+
+    def __init__(self, features, categories = None):
+        self.features = list(features)
+        self.categories = categories
+
+    def fit(self, df):
+        self.categories = None
+        return self.partial_fit(df)
+
+    def partial_fit(self, df):
+        """ Adds the categories found in df, so that the schema can be fitted chunk by chunk """
+        categories = self.categories or {feature: [] for feature in self.features}
+        self.categories = {feature: sorted(set(categories[feature]).union(df[feature].dropna().unique()))
+                           for feature in self.features}
+        return self
+
+    @property
+    def columns(self):
+        return [feature + '_' + str(category) for feature in self.features
+                for category in self.categories[feature][:-1]]
+
+    def transform(self, df):
+        """ Replaces the encoded features of df by their dummies """
+        block = np.zeros((df.shape[0], len(self.columns)), dtype=np.uint8)
+        rows = np.arange(df.shape[0])
+        offset = 0
+        for feature in self.features:
+            categories = self.categories[feature]
+            codes = pd.Categorical(df[feature], categories=categories).codes
+            valid = (codes >= 0) & (codes < len(categories) - 1)
+            block[rows[valid], offset + codes[valid]] = 1
+            offset += len(categories) - 1
+        dummies = pd.DataFrame({column: pd.Categorical.from_codes(block[:, j], categories=[0, 1])
+                                for j, column in enumerate(self.columns)}, index=df.index, columns=self.columns)
+        return pd.concat([df.drop(self.features, axis=1), dummies], axis=1)
+
+    def to_dict(self):
+        return {'features': self.features, 'categories': self.categories}
+
+    @classmethod
+    def from_dict(cls, state):
+        return cls(state['features'], state['categories'])
+
+    def save(self, path):
+        with open(path, 'w') as file:
+            json.dump(self.to_dict(), file)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as file:
+            return cls.from_dict(json.load(file))
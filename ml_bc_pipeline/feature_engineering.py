@@ -1,10 +1,8 @@
 ﻿import sys
 import numpy as np
 import pandas as pd
-import datetime
-import re
 
-from scipy.stats import stats, chi2_contingency
+from scipy.stats import stats
 from sklearn.discriminant_analysis import LinearDiscriminantAnalysis
 from sklearn.decomposition import FactorAnalysis
 from sklearn.decomposition import FastICA
@@ -12,15 +10,14 @@ from sklearn.decomposition import PCA
 from sklearn.ensemble import ExtraTreesClassifier
 from sklearn.feature_selection import RFE, SelectKBest, f_classif
 from sklearn.linear_model import LogisticRegression
-import statsmodels.api as sm
 from sklearn.metrics import accuracy_score
-from sklearn.preprocessing import KBinsDiscretizer, MinMaxScaler,PowerTransformer
-from imblearn.over_sampling import SMOTENC,SMOTE,ADASYN
-from ga_feature_selection.feature_selection_ga import FeatureSelectionGA
+from sklearn.preprocessing import MinMaxScaler,PowerTransformer
 from sklearn.tree import DecisionTreeClassifier
 from sklearn.model_selection import KFold
-
-from prince import MFA
+from ml_bc_pipeline.registry import FEATURE_SELECTORS
+from ml_bc_pipeline.business_features import FeatureBuilder, business_features
+from ml_bc_pipeline.feature_stats import uniform_bin_codes, contingency_tables, chi2_tables, ContingencyTables, \
+    information_gains, fisher_scores, univariate_regressions
 
 
 class FeatureEngineer:
@@ -38,60 +35,11 @@ class FeatureEngineer:
         print("Feature Engeneering Completed!")
 
     def _extract_business_features(self):
+        '''Appends the business features (see ml_bc_pipeline.business_features) to training and unseen'''
         self.report.append('_extract_business_features')
-
-        for dataset in [self.training, self.unseen]:
-
-            # TER CUIDADO, CONFIRMAR SE O NUM WEB PURCHASES TB É
-            a = dataset["NumWebPurchases"]
-            b = dataset["NumWebVisitsMonth"]
-            dataset["Web_Purchases_Per_Visit"] = np.divide(a, b, out=np.zeros_like(a), where=b!=0)
-            dataset["Total_Purchases"] = dataset["NumWebPurchases"] + dataset["NumCatalogPurchases"] + dataset["NumStorePurchases"]
-
-            b =  dataset["Total_Purchases"]
-            dataset["RatioWebPurchases"] = np.divide(a, b, out=np.zeros_like(a), where=b != 0)
-            a = dataset["NumCatalogPurchases"]
-            dataset["RatioCatalogPurchases"] = np.divide(a, b, out=np.zeros_like(a), where=b != 0)
-            a = dataset["NumStorePurchases"]
-            dataset["RatioStorePurchases"] = np.divide(a, b, out=np.zeros_like(a), where=b != 0)
-
-            dataset["Age"] = datetime.datetime.now().year - dataset["Year_Birth"]
-            dataset["TotalAcceptedCampaigns"] = dataset["AcceptedCmp1"].astype(int)+dataset["AcceptedCmp2"].astype(int)+ dataset["AcceptedCmp3"].astype(int)+dataset["AcceptedCmp4"].astype(int)+dataset["AcceptedCmp5"].astype(int)
-            # Total amount spent
-            dataset["TotalMoneySpent"] = dataset["MntWines"] + dataset["MntFruits"] + dataset["MntMeatProducts"] + dataset["MntFishProducts"] + dataset["MntSweetProducts"] + dataset["MntGoldProds"]
-            # Calculating the ratios of money spent per category
-            dataset["RatioWines"] = dataset["MntWines"] / dataset["TotalMoneySpent"]
-            dataset["RatioFruits"] = dataset["MntFruits"] / dataset["TotalMoneySpent"]
-            dataset["RatioMeatProducts"] = dataset["MntMeatProducts"] / dataset["TotalMoneySpent"]
-            dataset["RatioFishProducts"] = dataset["MntFishProducts"] / dataset["TotalMoneySpent"]
-            dataset["RatioSweetProducts"] = dataset["MntSweetProducts"] / dataset["TotalMoneySpent"]
-            dataset["RatioGoldProducts"] = dataset["MntGoldProds"] / dataset["TotalMoneySpent"]
-            a = dataset["TotalMoneySpent"]
-            dataset["MoneyPerPurchase"] = np.divide(a, b, out=np.zeros_like(a), where=b != 0)
-            # Changing income to 2 years
-            dataset["Income2Years"] = dataset["Income"] * 2
-
-            # Calculating Effort Rate
-            a = dataset["TotalMoneySpent"]
-            b = dataset["Income2Years"]
-            dataset["EffortRate"] = np.divide(a, b, out=np.zeros_like(a), where=b != 0)
-
-            # All kidataset
-            dataset["TotalKids"] = dataset["Teenhome"] + dataset["Kidhome"]
-
-            # People per Household
-            dataset["Count_Household"] = 0
-            dataset["Count_Household"] = 2*pd.to_numeric(dataset['Marital_Status_Married']).values + 2*pd.to_numeric(dataset['Marital_Status_Together']) + dataset["TotalKids"]
-            dataset["Count_Household"] = pd.to_numeric(dataset['Marital_Status_Divorced']) + pd.to_numeric(dataset['Marital_Status_Single']) + dataset["TotalKids"]
-
-
-            # Income per person in household
-            a = dataset["Income2Years"]
-            b = dataset["Count_Household"]
-            dataset["Income_Per_Person"] = np.divide(a, b, out=np.zeros_like(a), where=b != 0)
-            features_to_enconde = ['Education', 'Marital_Status']
-            dataset.replace([np.inf, -np.inf], np.nan, inplace=True)
-            dataset.fillna(0, inplace=True)
+        builder = FeatureBuilder(business_features())
+        self.training = builder.transform(self.training)
+        self.unseen = builder.transform(self.unseen)
 
     def lda_extraction(self):
         self.report.append('lda_extraction')
@@ -177,26 +125,26 @@ class FeatureEngineer:
         self._bx_cx_trans_dict = {"x": lambda x: x, "log": np.log, "sqrt": np.sqrt,
                                   "exp": np.exp, "**1/4": lambda x: np.power(x, 0.25),
                                   "**2": lambda x: np.power(x, 2), "**4": lambda x: np.power(x, 4)}
-        # 3) perform power transformations on scaled features and select the best
+        # 3) apply every transformation to all the scaled features at once and select the best by Chi-Squared
+        #    test, binning them uniformly and building all the contingency tables in one pass (see feature_stats)
+        X = self.training[num_features_BxCx].values
+        trans_labels = list(self._bx_cx_trans_dict)
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            X_trans = np.stack([np.round(self._bx_cx_trans_dict[trans_key](X), 4) for trans_key in trans_labels])
+        X_trans[trans_labels.index("log")][~np.isfinite(X_trans[trans_labels.index("log")])] = -50
+        n_trans, n_features = len(trans_labels), len(num_features_BxCx)
+        codes = uniform_bin_codes(X_trans.transpose(1, 0, 2).reshape(X.shape[0], n_trans * n_features), n_bins=10)
+        chi_test_values, _ = chi2_tables(contingency_tables(codes, self.training[target].values, n_levels=10))
+        chi_test_values = np.nan_to_num(chi_test_values.reshape(n_trans, n_features))
         self.best_bx_cx_dict = {}
-        for feature in num_features_BxCx:
-            best_test_value, best_trans_label, best_power_trans = 0, "", None
-            for trans_key, trans_value in self._bx_cx_trans_dict.items():
-                # 3) 1) 1) apply transformation on training data
-                feature_trans = np.round(trans_value(self.training[feature]), 4)
-                if trans_key == "log":
-                    feature_trans.loc[np.isfinite(feature_trans) == False] = -50
-                # 3) 1) 2) bin transformed feature (required to perform Chi-Squared test)
-                bindisc = KBinsDiscretizer(n_bins=10, encode="ordinal", strategy="uniform")
-                feature_bin = bindisc.fit_transform(feature_trans.values.reshape(-1, 1))
-                feature_bin = pd.Series(feature_bin[:, 0], index=self.training.index)
-                # 3) 1) 3) obtain contingency table
-                cont_tab = pd.crosstab(feature_bin, self.training[target], margins=False)
-                # 3) 1) 4) compute Chi-Squared test
-                chi_test_value = chi2_contingency(cont_tab)[0]
-                # 3) 1) 5) choose the best so far Box-Cox transformation based on Chi-Squared test
-                if chi_test_value > best_test_value:
-                    best_test_value, best_trans_label, best_power_trans = chi_test_value, trans_key, feature_trans
+        for j, feature in enumerate(num_features_BxCx):
+            # the first transformation with the largest (positive) statistic, the identity if none is positive;
+            # transformations giving the same table only differ by rounding, so they tie with the first of them
+            values = chi_test_values[:, j]
+            best = np.isclose(values, values.max(), rtol=1e-12, atol=0).argmax() if values.max() > 0 \
+                else trans_labels.index("x")
+            best_trans_label = trans_labels[best]
+            best_power_trans = pd.Series(X_trans[best, :, j], index=self.training.index)
             self.best_bx_cx_dict[feature] = (best_trans_label, best_power_trans)
             # 3) 2) append transformed feature to the data frame
             self.training[feature] = best_power_trans
@@ -208,7 +156,7 @@ class FeatureEngineer:
     def multi_factor_analysis(self, n_components, n_iterations):
         X = self.training.drop(columns = ['Response'])
         groups = {'categorical': X.loc[:, self.training.dtypes != 'category'].columns,'numerical': X.loc[:, self.training.dtypes == 'category'].columns}
-        mfa = MFA(
+        mfa = FEATURE_SELECTORS['mfa'](
         groups = groups,
         n_components = n_components,
         n_iter = n_iterations,
@@ -239,23 +187,13 @@ class FeatureEngineer:
     ########FEATURE SELECTION################################
 
     def rank_features_chi_square(self, n):
+        '''Ranks the features by Chi-Squared test against Response, continuous features binned in 10 uniform bins. All
+        the tables are built in one pass and cached by data fingerprint (see feature_stats.ContingencyTables).'''
         self.report.append('rank_features_chi_square')
-        chisq_dict = {}
         continuous_flist = self.training.drop('Response',axis = 1).loc[:,self.training.dtypes != 'category'].columns
         categorical_flist = self.training.drop('Response',axis = 1).loc[:, self.training.dtypes == 'category'].columns
-        if len(continuous_flist)>0:
-            bindisc = KBinsDiscretizer(n_bins=10, encode='ordinal', strategy="uniform")
-            for feature in continuous_flist:
-                feature_bin = bindisc.fit_transform(self.training[feature].values[:, np.newaxis])
-                feature_bin = pd.Series(feature_bin[:, 0], index=self.training.index)
-                cont_tab = pd.crosstab(feature_bin, self.training["Response"], margins=False)
-                chisq_dict[feature] = chi2_contingency(cont_tab.values)[0:2]
-        if len(categorical_flist)>0:
-            for feature in categorical_flist:
-                cont_tab = pd.crosstab(self.training[feature], self.training["Response"], margins=False)
-                chisq_dict[feature] = chi2_contingency(cont_tab.values)[0:2]
-
-        df_chisq_rank = pd.DataFrame(chisq_dict, index=["Chi-Squared", "p-value"]).transpose()
+        tables = ContingencyTables.of(self.training, "Response", continuous_flist, categorical_flist, n_bins=10)
+        df_chisq_rank = tables.chi2()
         df_chisq_rank.sort_values("Chi-Squared", ascending=False, inplace=True)
         df_chisq_rank["valid"] = df_chisq_rank["p-value"] <= 0.05
         self._rank["chisq"] = df_chisq_rank
@@ -270,35 +208,17 @@ class FeatureEngineer:
         return self.training[input_features], self.unseen[input_features]
 
     def linear_regression_selection(self, vd, n):
+        '''Top n variables by adjusted R2 of the regression (no intercept) of vd on each of them, all fitted at once
+        (see feature_stats.univariate_regressions)'''
         self.report.append('linear_regression_selection')
-        reg_results = pd.DataFrame(columns=['variable', 'Coef', 'std_err', 'adj_R2', 'pvalue'])
-        X = self.training[vd]
-        for var in self.training.drop(columns=vd).columns:
-            Y = self.training[var]
-            model = sm.OLS(X, Y).fit()
-            predictions = model.predict(X)
-            reg_results = reg_results.append({'variable': var, 'Coef': model.params[0], 'std_err': model.bse[0],
-                                              'pvalue': model.pvalues[0], 'adj_R2': model.rsquared_adj},
-                                             ignore_index=True)
-            reg_results.sort_values(by='adj_R2', inplace=True, ascending=False)
-
-        return np.array(reg_results.head(n)['variable'].values)
+        reg_results = univariate_regressions(self.training.drop(columns=vd), self.training[vd])
+        reg_results = reg_results.sort_values(by='adj_R2', ascending=False)
+        return np.array(reg_results.head(n).index)
 
     def fisher_score(self, vd, n):
+        '''Top n variables by Fisher score about vd, from the class moments of one group-by (see feature_stats.fisher_scores)'''
         self.report.append('fisher_score')
-        ds = self.training
-        f_score = []
-        num = []
-        den = []
-        for class_ in np.unique(ds[vd]):
-            nj = ds[ds[vd] == class_].shape[0]
-            uij = ds[ds[vd] == class_].mean()
-            ui = ds.mean()
-            pij = ds[ds[vd] == class_].var()
-            num.append(nj * (uij - ui) ** 2)
-            den.append(nj * pij)
-        results = sum(num) / sum(den)
-        results.drop(labels='Response', inplace=True)
+        results = fisher_scores(self.training, vd).drop(labels='Response', errors='ignore')
         results.sort_values(ascending=False, inplace=True)
         return np.array(results.head(n).index)
 
@@ -312,49 +232,26 @@ class FeatureEngineer:
             return 0
 
     def all_inf_gain(self, vd, n):
+        '''Best binary split (key "variable_threshold") of every non categorical variable by information gain about vd,
+        sorted by gain in descending order (see feature_stats.information_gains)'''
         self.report.append('all_inf_gain')
         ds = self.training.loc[:, self.training.dtypes != 'category']
-        vars_inf_gain = []
         best_dict = {}
-        for var in ds:
-            v = np.sort(ds[var].unique())
-            dict_gains = {}
-            for i in range(0, len(v) - 1):
-                fbin_i = ds[var] <= v[i]
-                _0 = ds[vd][~fbin_i]
-                _1 = ds[vd][fbin_i]
-                res = self.entropy(ds[vd]) - ((~fbin_i).mean() * self.entropy(_0) + fbin_i.mean() * self.entropy(_1))
-                dict_gains[var + "_" + str(v[i])] = res
-            vars_inf_gain.append(dict_gains)
-
-        vars_inf_gain = {k: v for d in vars_inf_gain for k, v in d.items()}
-
-        best_dict = {}
-        keys = [key for key in vars_inf_gain.keys()]
         for var in ds.drop(columns=vd):
-            r = re.compile(var + '_.*')
-            vals = [vars_inf_gain[x] for x in list(filter(r.match, keys))]
-            if vals:
-                best_dict[list(vars_inf_gain.keys())[list(vars_inf_gain.values()).index(max(vals))]] = max(vals)
+            thresholds, gains = information_gains(ds[var].values, ds[vd].values)
+            if len(gains):
+                best = gains.argmax()
+                best_dict[var + "_" + str(thresholds[best])] = gains[best]
 
         best_dict = dict(sorted(best_dict.items(), key=lambda kv: kv[1], reverse=True))
-        ks = [k.split('_')[0] for k in best_dict.keys()]
         return [k for k in best_dict.keys()]
 
     def ind_inf_gain(self, var, vd):
+        '''Information gain about vd of every binary split of var, as {"var_threshold": gain}'''
         self.report.append('ind_inf_gain')
         ds = self.training
-        v = np.sort(ds[var].unique())
-        dict_gains = {}
-
-        for i in range(0, len(v) - 1):
-            fbin_i = ds[var] <= v[i]
-            _0 = ds[vd][~fbin_i]
-            _1 = ds[vd][fbin_i]
-            dict_gains[var + "_" + str(v[i])] = self.entropy(ds[vd]) - (
-                        (~fbin_i).mean() * self.entropy(_0) + fbin_i.mean() * self.entropy(_1))
-
-        return dict_gains
+        thresholds, gains = information_gains(ds[var].values, ds[vd].values)
+        return {var + "_" + str(threshold): gain for threshold, gain in zip(thresholds, gains)}
 
     def recursive_feature_elimination(self, vd, n):
         self.report.append('recursive_feature_elimination')
@@ -456,7 +353,7 @@ class FeatureEngineer:
 
     def ga_feature_selection(self,model):
 
-        feature_selection = FeatureSelectionGA(model,
+        feature_selection = FEATURE_SELECTORS['ga'](model,
                                                self.training.loc[:, self.training.columns != "Response"].values,
                                                self.training["Response"].values)
         feature_selection.generate(n_pop=50, ngen=4)
@@ -475,9 +372,9 @@ class FeatureEngineer:
         x_cols = X.columns
         cat_cols = X.loc[:, self.training.dtypes == 'category'].columns
         if len(cat_cols) > 0:
-            sm = SMOTENC(random_state=self.seed, categorical_features=[cat_cols.get_loc(col) for col in cat_cols])
+            sm = FEATURE_SELECTORS['smote_nc'](random_state=self.seed, categorical_features=[cat_cols.get_loc(col) for col in cat_cols])
         else:
-            sm = SMOTE(random_state=self.seed)
+            sm = FEATURE_SELECTORS['smote'](random_state=self.seed)
         X_res, Y_res = sm.fit_resample(X.values, Y.values)
         sampled_ds = pd.DataFrame(X_res, columns=x_cols)
         sampled_ds['Response'] = Y_res
@@ -488,7 +385,7 @@ class FeatureEngineer:
         self.report.append('SMOTE_sampling')
         Y = ds["Response"]
         X = ds.drop(columns=["Response"])
-        sm = SMOTE(random_state=self.seed)
+        sm = FEATURE_SELECTORS['smote'](random_state=self.seed)
         X_res, Y_res = sm.fit_resample(X, Y)
         sampled_ds = pd.DataFrame(X_res)
         sampled_ds['Response'] = Y_res
@@ -501,7 +398,7 @@ class FeatureEngineer:
         self.report.append('Adasyn_sampling')
         Y = ds["Response"]
         X = ds.drop(columns=["Response"])
-        ada = ADASYN(random_state=self.seed)
+        ada = FEATURE_SELECTORS['adasyn'](random_state=self.seed)
         X_res, Y_res = ada.fit_resample(X, Y)
         sampled_ds = pd.DataFrame(X_res)
         sampled_ds['Response'] = Y_res
@@ -0,0 +1,243 @@
+import numpy as np
+import pandas as pd
+from scipy.stats import chi2, t
+from ml_bc_pipeline.cache import frame_fingerprint
+
+# ContingencyTables already built, by content fingerprint of the data, see ContingencyTables.of
+_TABLE_CACHE = {}
+
+
+def uniform_bin_codes(X, n_bins=10, low=None, high=None):
+    """ Bins every column of X into n_bins uniform bins between its minimum and maximum
+
+        Same bins as KBinsDiscretizer(n_bins, encode='ordinal', strategy='uniform') of the pinned scikit-learn,
+        computed for all the columns at once. Constant columns get a single bin. The range of the bins can be
+        given with low and high (per column), e.g. to bin the chunks of a stream alike. Returns the (records x
+        columns) bin codes.
+
+    """
+    X = np.asarray(X, dtype=np.float64)
+    X = X.reshape(-1, 1) if X.ndim == 1 else X
+    low = X.min(axis=0) if low is None else np.asarray(low, dtype=np.float64)
+    high = X.max(axis=0) if high is None else np.asarray(high, dtype=np.float64)
+    width = (high - low) / n_bins
+    # KBinsDiscretizer nudges values by a small tolerance so that values on an edge fall in the upper bin
+    shifted = X - low
+    shifted += 1.e-8 + 1.e-5 * np.abs(X)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        shifted /= np.where(width > 0, width, np.inf)
+    codes = np.floor(shifted).astype(np.int64)
+    return np.clip(codes, 0, n_bins - 1, out=codes)
+
+
+def contingency_tables(codes, y, n_levels=None, n_classes=None):
+    """ (columns x levels x classes) counts of every column of codes against the class codes y, in one bincount
+
+        Negative codes (missing values) are not counted.
+
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    codes = codes.reshape(-1, 1) if codes.ndim == 1 else codes
+    y = np.asarray(y, dtype=np.int64)
+    n_levels = codes.max() + 1 if n_levels is None else n_levels
+    n_classes = y.max() + 1 if n_classes is None else n_classes
+    n_columns = codes.shape[1]
+    valid = (codes >= 0) & (y >= 0)[:, np.newaxis]
+    cells = (np.arange(n_columns) * n_levels + codes) * n_classes + y[:, np.newaxis]
+    counts = np.bincount(cells[valid], minlength=n_columns * n_levels * n_classes)
+    return counts.reshape(n_columns, n_levels, n_classes)
+
+
+def chi2_tables(tables):
+    """ Chi-squared statistics and p-values of the independence test of every contingency table in tables
+
+        Vectorized chi2_contingency over a (tables x levels x classes) array: empty levels and classes are left
+        out of each table (as a crosstab would), the degrees of freedom are counted per table and Yates'
+        correction is applied to the tables with one degree of freedom. Tables with no degree of freedom get a
+        statistic of 0 and a p-value of 1.
+
+    """
+    observed = np.asarray(tables, dtype=np.float64)
+    rows, columns = observed.sum(axis=2), observed.sum(axis=1)
+    total = rows.sum(axis=1)
+    dof = (np.count_nonzero(rows, axis=1) - 1) * (np.count_nonzero(columns, axis=1) - 1)
+    dof = np.maximum(dof, 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        expected = rows[:, :, np.newaxis] * columns[:, np.newaxis, :] / total[:, np.newaxis, np.newaxis]
+        difference = observed - expected
+        yates = (dof == 1)[:, np.newaxis, np.newaxis]
+        difference = np.where(yates, np.sign(difference) * np.maximum(np.abs(difference) - 0.5, 0), difference)
+        terms = np.where(expected > 0, difference ** 2 / expected, 0)
+    statistic = np.where(dof > 0, terms.sum(axis=(1, 2)), 0)
+    p_value = np.where(dof > 0, chi2.sf(statistic, np.maximum(dof, 1)), 1)
+    return statistic, p_value
+
+
+def _entropy(counts):
+    """ Entropy (in bits) of the class distribution of every row of counts """
+    counts = np.asarray(counts, dtype=np.float64)
+    total = counts.sum(axis=-1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p = counts / total
+        return -np.where(p > 0, p * np.log2(p), 0).sum(axis=-1)
+
+
+def information_gains(x, y):
+    """ Information gain about y of every binary split x <= threshold, for all the thresholds of x at once
+
+        x is sorted once and the class counts below each threshold are cumulative sums, so all the candidate
+        thresholds (every distinct value of x but the largest; missing values always fall above) are evaluated
+        in one vectorized expression. Returns the thresholds, in ascending order and in the dtype of x (so they
+        print as the values of x do), and their gains.
+
+    """
+    values = np.asarray(x)
+    x = values.astype(np.float64)
+    classes, y = np.unique(np.asarray(y), return_inverse=True)
+    order = np.argsort(x, kind='mergesort')
+    x_sorted = x[order]
+    one_hot = np.zeros((len(x), len(classes)), dtype=np.int64)
+    one_hot[np.arange(len(x)), y[order]] = 1
+    below = np.cumsum(one_hot, axis=0)
+    # last position of every distinct value that has a larger (or missing) value after it
+    ends = np.flatnonzero((x_sorted[1:] != x_sorted[:-1]) & ~np.isnan(x_sorted[:-1]))
+    total = below[-1] if len(x) else np.zeros(len(classes), dtype=np.int64)
+    left, right = below[ends], total - below[ends]
+    n_left = (ends + 1) / max(len(x), 1)
+    gains = _entropy(total) - (n_left * _entropy(left) + (1 - n_left) * _entropy(right))
+    return values[order[ends]], gains
+
+
+def class_moments(df, classes):
+    """ Size, means and variances (ddof=1) of every column of df within each class, in one group-by
+
+        Returns the sizes as a Series and the means and variances as (classes x columns) DataFrames.
+
+    """
+    grouped = df.groupby(np.asarray(classes))
+    return grouped.size(), grouped.mean(), grouped.var()
+
+
+def fisher_scores(df, target):
+    """ Fisher score of every numerical column of df (but target) with respect to the classes of target
+
+        Between-class scatter over within-class scatter, sum_j n_j (mean_j - mean) ** 2 / sum_j n_j var_j,
+        from the class moments of a single group-by (see class_moments).
+
+    """
+    features = df.drop(columns=target).select_dtypes(include=[np.number])
+    sizes, means, variances = class_moments(features, df[target])
+    between = ((means - features.mean()) ** 2).mul(sizes, axis=0).sum(skipna=False)
+    within = variances.mul(sizes, axis=0).sum(skipna=False)
+    return between / within
+
+
+def univariate_regressions(X, y, intercept=False):
+    """ Simple regression of y on every column of X, all in closed form from centered cross-products
+
+        Means, centered sums of squares and centered cross-products are computed once for all the columns; the
+        coefficient, its standard error, t-test p-value and the adjusted R2 of every regression follow from them.
+        Without intercept (as OLS(y, x) of statsmodels with no constant) the uncentered sums are recovered from the
+        centered ones, and R2 is uncentered, as statsmodels reports it. Returns a DataFrame indexed by the columns
+        of X with columns Coef, std_err, adj_R2 and pvalue.
+
+    """
+    columns = list(X.columns)
+    X = X.to_numpy(dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    x_mean, y_mean = X.mean(axis=0), y.mean()
+    X_centered, y_centered = X - x_mean, y - y_mean
+    sxx = np.einsum('ij,ij->j', X_centered, X_centered)
+    sxy = y_centered.dot(X_centered)
+    syy = y_centered.dot(y_centered)
+    if not intercept:
+        sxx, sxy, syy = sxx + n * x_mean ** 2, sxy + n * x_mean * y_mean, syy + n * y_mean ** 2
+    df_resid = n - 2 if intercept else n - 1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        coef = sxy / sxx
+        ssr = np.maximum(syy - coef * sxy, 0)
+        std_err = np.sqrt(ssr / df_resid / sxx)
+        p_value = 2 * t.sf(np.abs(coef / std_err), df_resid)
+        adj_r2 = 1 - (n - intercept) / df_resid * ssr / syy
+    return pd.DataFrame({'Coef': coef, 'std_err': std_err, 'adj_R2': adj_r2, 'pvalue': p_value}, index=columns,
+                        columns=['Coef', 'std_err', 'adj_R2', 'pvalue'])
+
+
+class ContingencyTables:
+    """ Contingency tables of several features against a target
+
+        Continuous features are binned in n_bins uniform bins (see uniform_bin_codes) and categorical ones are
+        taken as they are; the tables of all the features are built in one bincount (see contingency_tables).
+        Tables are kept with the labels of their levels and classes, so the tables of different chunks of the
+        same data (continuous features binned over the same bounds) can be merged, and chi2 tests them all at
+        once.
+
+    """
+
+    def __init__(self, tables, levels, classes):
+        self.tables = tables
+        self.levels = levels
+        self.classes = list(classes)
+
+    @classmethod
+    def from_frame(cls, df, target, continuous=(), categorical=(), n_bins=10, bounds=None):
+        """ Tables of the continuous and categorical features of df; bounds is (low, high) of the continuous ones """
+        continuous, categorical = list(continuous), list(categorical)
+        classes, y = np.unique(df[target].values, return_inverse=True)
+        low, high = (None, None) if bounds is None else bounds
+        codes = [uniform_bin_codes(df[continuous].values, n_bins, low, high)] if continuous else []
+        levels = {feature: list(range(n_bins)) for feature in continuous}
+        for feature in categorical:
+            feature_codes, uniques = pd.factorize(df[feature], sort=True)
+            codes.append(feature_codes.reshape(-1, 1))
+            levels[feature] = list(uniques)
+        codes = np.hstack(codes) if codes else np.zeros((len(df), 0), dtype=np.int64)
+        n_levels = max([len(feature_levels) for feature_levels in levels.values()] + [1])
+        counts = contingency_tables(codes, y, n_levels, len(classes))
+        tables = {feature: counts[j, :len(levels[feature])] for j, feature in enumerate(continuous + categorical)}
+        return cls(tables, levels, classes)
+
+    @classmethod
+    def of(cls, df, target, continuous=(), categorical=(), n_bins=10):
+        """ from_frame, cached by the fingerprint of the data so that repeated rankings reuse the tables """
+        columns = list(continuous) + list(categorical) + [target]
+        key = (frame_fingerprint(df[columns]), target, tuple(continuous), tuple(categorical), n_bins)
+        if key not in _TABLE_CACHE:
+            _TABLE_CACHE[key] = cls.from_frame(df, target, continuous, categorical, n_bins)
+        return _TABLE_CACHE[key]
+
+    @classmethod
+    def from_chunks(cls, chunks, target, continuous=(), categorical=(), n_bins=10, bounds=None):
+        """ Tables of a stream of chunks, merged; continuous features need the (low, high) bounds of the data """
+        if continuous and bounds is None:
+            raise ValueError('The bounds of the continuous features are needed to bin chunks alike')
+        tables = None
+        for chunk in chunks:
+            chunk_tables = cls.from_frame(chunk, target, continuous, categorical, n_bins, bounds)
+            tables = chunk_tables if tables is None else tables.merge(chunk_tables)
+        return tables
+
+    def merge(self, other):
+        """ Adds the counts of other, aligning levels and classes by label """
+        classes = sorted(set(self.classes).union(other.classes))
+        tables, levels = {}, {}
+        for feature in self.tables:
+            levels[feature] = sorted(set(self.levels[feature]).union(other.levels[feature]))
+            table = np.zeros((len(levels[feature]), len(classes)), dtype=np.int64)
+            for source in (self, other):
+                rows = [levels[feature].index(level) for level in source.levels[feature]]
+                columns = [classes.index(class_) for class_ in source.classes]
+                table[np.ix_(rows, columns)] += source.tables[feature]
+            tables[feature] = table
+        return ContingencyTables(tables, levels, classes)
+
+    def chi2(self):
+        """ Chi-squared statistic and p-value of every feature (see chi2_tables), as a DataFrame """
+        features = list(self.tables)
+        n_levels = max([table.shape[0] for table in self.tables.values()] + [1])
+        padded = np.zeros((len(features), n_levels, len(self.classes)), dtype=np.int64)
+        for j, feature in enumerate(features):
+            padded[j, :self.tables[feature].shape[0]] = self.tables[feature]
+        statistic, p_value = chi2_tables(padded)
+        return pd.DataFrame({"Chi-Squared": statistic, "p-value": p_value}, index=features)
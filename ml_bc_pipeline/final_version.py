@@ -15,6 +15,9 @@ from os import listdir
 import json
 from sklearn.utils import class_weight
 
+# fitted preprocessing, new campaign batches are preprocessed with Processor.load(PROCESSOR_PATH).transform(batch)
+PROCESSOR_PATH = 'processor.joblib'
+
 
 def main():
     # ===========================
@@ -62,13 +65,15 @@ def main():
                 averages = averages.append(pd.DataFrame([var_averages], columns=columns_))
         return averages
 
-    ds = Dataset("ml_project1_data.xlsx").rm_df
-    students = Dataset('unseen_students.xlsx',True).rm_df
+    dataset = Dataset("ml_project1_data.xlsx")
+    ds = dataset.rm_df
+    students = Dataset('unseen_students.xlsx',True, encoder=dataset.encoder).rm_df
 
 
     #EVALUATION
     # +++++++++++++++++ 3) preprocess, based on train
     pr = Processor(ds, students, 1)
+    pr.save(PROCESSOR_PATH)
     pipeline['preprocessing'] = pr.report
 
     # +++++++++++++++++ 4) feature engineering
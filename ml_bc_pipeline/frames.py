@@ -0,0 +1,79 @@
+import numpy as np
+
+
+class FrameView:
+    """ Copy-on-write view of some rows of a DataFrame
+
+        A FrameView is a base DataFrame plus the positions of the rows it holds. Selecting folds (take),
+        dropping records (dropna, drop) or reading columns never copies the base: row operations only narrow
+        the positions, and reads return just the requested columns of those rows. The rows are copied once,
+        by materialize, when a stage actually needs to write them; the base is never modified.
+
+    """
+
+    def __init__(self, base, rows=None):
+        self.base = base
+        self.rows = np.arange(len(base)) if rows is None else np.asarray(rows, dtype=np.int64)
+
+    @classmethod
+    def of(cls, data):
+        """ data itself if it is already a FrameView, a view of all its rows otherwise """
+        return data if isinstance(data, cls) else cls(data)
+
+    @property
+    def index(self):
+        return self.base.index[self.rows]
+
+    @property
+    def columns(self):
+        return self.base.columns
+
+    @property
+    def dtypes(self):
+        return self.base.dtypes
+
+    @property
+    def shape(self):
+        return len(self.rows), self.base.shape[1]
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, column):
+        return column in self.base
+
+    def __getitem__(self, key):
+        """ Column (Series) or columns (DataFrame) of the rows of the view """
+        if isinstance(key, list):
+            positions = self.base.columns.get_indexer_for(key)
+            if (positions == -1).any():
+                raise KeyError('{} not in columns'.format([column for column, position in zip(key, positions)
+                                                           if position == -1]))
+            return self.base.iloc[self.rows, positions]
+        return self.base[key].iloc[self.rows]
+
+    def take(self, positions):
+        """ View of the rows at positions (relative to this view), e.g. the indices of a fold """
+        return FrameView(self.base, self.rows[positions])
+
+    def dropna(self):
+        """ View without the records that have missing values """
+        missing = np.zeros(len(self.rows), dtype=bool)
+        for column in self.base.columns:
+            missing |= self.base[column].isna().values[self.rows]
+        return FrameView(self.base, self.rows[~missing])
+
+    def drop(self, labels):
+        """ View without the records whose index is in labels """
+        return FrameView(self.base, self.rows[~self.index.isin(labels)])
+
+    def materialize(self):
+        """ The rows of the view as a new DataFrame, which can be modified without affecting the base """
+        if len(self.rows) == len(self.base) and (self.rows == np.arange(len(self.base))).all():
+            return self.base.copy()
+        return self.base.take(self.rows)
+
+
+def materialize(data):
+    """ data as a DataFrame of its own: FrameViews are materialized, DataFrames are returned as they are """
+    return data.materialize() if isinstance(data, FrameView) else data
@@ -0,0 +1,101 @@
+import warnings
+import numpy as np
+import pandas as pd
+from scipy.stats import kstest
+from ml_bc_pipeline.cache import frame_fingerprint
+
+# KS decisions of the frames already tested, by content fingerprint, see normality_strategies
+_STRATEGY_CACHE = {}
+
+
+def normality_strategies(df, columns, alpha=0.05):
+    """ 'mean' for the columns of df whose observed values pass a Kolmogorov-Smirnov normality test, 'median' otherwise
+
+        Each column is tested against the normal distribution fitted to it. Decisions are cached by the
+        fingerprint of the data (see ml_bc_pipeline.cache.frame_fingerprint), so re-running a pipeline on the
+        same training data does not test it again.
+
+    """
+    key = (frame_fingerprint(df[columns]), alpha)
+    if key not in _STRATEGY_CACHE:
+        strategies = {}
+        for column in columns:
+            values = df[column].to_numpy(dtype=np.float64)
+            values = values[~np.isnan(values)]
+            p_value = kstest(values, 'norm', args=(values.mean(), values.std()))[1] if len(values) else 0
+            strategies[column] = 'mean' if p_value > alpha else 'median'
+        _STRATEGY_CACHE[key] = strategies
+    return dict(_STRATEGY_CACHE[key])
+
+
+def _as_categorical(series):
+    return series if pd.api.types.is_categorical_dtype(series) else series.astype('category')
+
+
+class BatchImputer:
+    """ Fitted missing value imputation of numerical and categorical variables
+
+        Numerical variables are filled with their mean when they look normally distributed and with their median
+        otherwise (see normality_strategies); the fill values are computed for all the columns at once and the
+        missing cells of the whole numerical block are filled in a single matrix operation. Categorical variables
+        are filled with their most frequent category, found by counting their category codes, and returned as
+        category columns.
+
+    """
+
+    def __init__(self, numerical, categorical, alpha=0.05):
+        self.numerical = list(numerical)
+        self.categorical = list(categorical)
+        self.alpha = alpha
+        self.strategies = None
+        self.fill_values = None
+
+    def fit(self, df):
+        numerical = [column for column in self.numerical if column in df]
+        self.strategies = normality_strategies(df, numerical, self.alpha)
+        block = df[numerical].to_numpy(dtype=np.float64)
+        medians = [column for column in numerical if self.strategies[column] == 'median']
+        # all-missing columns get NaN
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            fill = np.nanmean(block, axis=0)
+            if medians:
+                positions = [numerical.index(column) for column in medians]
+                fill[positions] = np.nanmedian(block[:, positions], axis=0)
+        self.fill_values = dict(zip(numerical, fill))
+        for column in self.categorical:
+            if column not in df:
+                continue
+            series = _as_categorical(df[column])
+            codes = series.cat.codes.values
+            counts = np.bincount(codes[codes >= 0], minlength=len(series.cat.categories))
+            # ties go to the first (smallest) category, as for SimpleImputer(strategy='most_frequent')
+            self.fill_values[column] = series.cat.categories[counts.argmax()] if counts.sum() > 0 else None
+        return self
+
+    def transform(self, df, inplace=False):
+        if not inplace:
+            df = df.copy()
+        numerical = [column for column in self.numerical if column in df and column in self.fill_values]
+        block = df[numerical].to_numpy(dtype=np.float64, copy=True)
+        missing = np.isnan(block)
+        if missing.any():
+            block[missing] = np.array([self.fill_values[column] for column in numerical])[np.nonzero(missing)[1]]
+            df[numerical] = block
+        for column in self.categorical:
+            if column not in df:
+                continue
+            series = _as_categorical(df[column])
+            value = self.fill_values.get(column)
+            codes = series.cat.codes.values
+            if value is not None and (codes < 0).any():
+                if value not in series.cat.categories:
+                    series = series.cat.add_categories([value])
+                codes = series.cat.codes.values.copy()
+                codes[codes < 0] = series.cat.categories.get_loc(value)
+                series = pd.Series(pd.Categorical.from_codes(codes, series.cat.categories), index=df.index)
+            df[column] = series
+        return df
+
+    def fit_transform(self, df, inplace=False):
+        return self.fit(df).transform(df, inplace)
@@ -1,8 +1,6 @@
 import sys
 import numpy as np
 import pandas as pd
-import matplotlib
-import matplotlib.pyplot as plt
 from sklearn.pipeline import Pipeline
 from sklearn.model_selection import GridSearchCV, cross_validate
 from sklearn.neural_network import MLPClassifier
@@ -11,19 +9,16 @@ from sklearn.tree import DecisionTreeClassifier
 from sklearn.naive_bayes import ComplementNB
 from sklearn.linear_model import LogisticRegression
 from sklearn.ensemble import VotingClassifier, AdaBoostClassifier, GradientBoostingClassifier
-from xgboost import XGBClassifier
 from sklearn.ensemble import ExtraTreesClassifier
 from sklearn.model_selection import StratifiedKFold
-from bayes_opt import BayesianOptimization
-from gplearn.genetic import SymbolicRegressor,SymbolicClassifier
 from sklearn.svm import SVC
 from sklearn.cluster import KMeans
 from ml_bc_pipeline.data_preprocessing import Processor
 from ml_bc_pipeline.feature_engineering import FeatureEngineer
+from ml_bc_pipeline.frames import FrameView
 from sklearn.mixture import GaussianMixture
 from sklearn.metrics import silhouette_score
-from bayes_opt.observer import JSONLogger
-from bayes_opt.event import Events
+from ml_bc_pipeline.registry import MODELS, OPTIMIZERS, PLOTTING
 
 
 def grid_search_MLP(training, param_grid, seed, cv=5):
@@ -74,7 +69,7 @@ def bayes_optimization_MLP(training, param_grid, seed, cv=5):
             return profit(test['Response'],y_pred)
 
 
-    b_optimizer = BayesianOptimization(f=ob_function, pbounds=n_param_grid, random_state=1)
+    b_optimizer = OPTIMIZERS['bayesian_optimization'](f=ob_function, pbounds=n_param_grid, random_state=1)
     b_optimizer.maximize(n_iter = 300, init_points = 100)
 
 def decision_tree(training, param_grid, seed, cv=5):
@@ -107,7 +102,7 @@ def logistic_regression(training, param_grid, seed, cv=5):
     return clf_gscv
 
 def bo_logistic_regression(training, param_grid, seed, cv= 5):
-    logger = JSONLogger(path="./logs.json")
+    logger = OPTIMIZERS['json_logger'](path="./logs.json")
 
 
     n_param_grid = {}
@@ -122,8 +117,8 @@ def bo_logistic_regression(training, param_grid, seed, cv= 5):
     def ob_function(C):
         skf = StratifiedKFold(n_splits=cv, shuffle=True)
         for train_index, test_index in skf.split(training.loc[:, (training.columns != "Response")].values,training["Response"].values):
-            train = training.iloc[train_index]
-            test = training.iloc[test_index]
+            train = FrameView(training, train_index)
+            test = FrameView(training, test_index)
             pr = Processor(train, test, seed)
             fe = FeatureEngineer(pr.training, pr.unseen, seed)
             model  = LogisticRegression(random_state=seed, C = C, max_iter=200,)
@@ -132,8 +127,8 @@ def bo_logistic_regression(training, param_grid, seed, cv= 5):
             return profit(test['Response'],y_pred)
 
 
-    b_optimizer = BayesianOptimization(f=ob_function, pbounds=n_param_grid, random_state=1,)
-    b_optimizer.subscribe(Events.OPTMIZATION_STEP, logger)
+    b_optimizer = OPTIMIZERS['bayesian_optimization'](f=ob_function, pbounds=n_param_grid, random_state=1,)
+    b_optimizer.subscribe(OPTIMIZERS['events'].OPTMIZATION_STEP, logger)
     b_optimizer.maximize(n_iter = 100, init_points = 50)
     return b_optimizer
 
@@ -147,7 +142,7 @@ def extraTreesClassifier(training, param_grid, seed, cv = 5):
     return clf_gscv
 
 def gp_grid_search(training, param_grid, seed, cv = 5):
-    pipeline = Pipeline([("gp",SymbolicClassifier( random_state = seed))])
+    pipeline = Pipeline([("gp",MODELS['symbolic_classifier']( random_state = seed))])
 
     clf_gscv = GridSearchCV(pipeline, param_grid, cv=cv, n_jobs=-1, scoring=make_scorer(profit))
     clf_gscv.fit(training.loc[:, training.columns != "Response"].values, training["Response"].values)
@@ -156,7 +151,7 @@ def gp_grid_search(training, param_grid, seed, cv = 5):
 
 def gp(training, param_grid, seed, cv=5):
 
-    pipeline = Pipeline([ ("gp", SymbolicClassifier(random_state=seed))])
+    pipeline = Pipeline([ ("gp", MODELS['symbolic_classifier'](random_state=seed))])
     print("gp>>>",training.shape)
     clf_gscv = GridSearchCV(pipeline, param_grid, cv=cv, n_jobs=-1, scoring=make_scorer(profit))
     clf_gscv.fit(training.loc[:, training.columns != "Response"].values, training["Response"].values)
@@ -183,7 +178,7 @@ def ensemble(training, classifiers):
     return clf
 
 def xgboost(training,param_grid, seed, cv = 5):
-    pipeline = Pipeline([ ("xg", XGBClassifier(random_state=seed))])
+    pipeline = Pipeline([ ("xg", MODELS['xgboost'](random_state=seed))])
 
     xg_gscv = GridSearchCV(pipeline, param_grid, cv=cv, n_jobs=-1, scoring=make_scorer(profit))
     xg_gscv.fit(training.loc[:, training.columns != "Response"].values, training["Response"].values)
@@ -231,6 +226,7 @@ def assess_generalization_auroc(estimator, unseen, print_graph):
     auc = roc_auc_score(unseen["Response"], y_score, average="weighted")
 
     if print_graph:
+        plt = PLOTTING['pyplot']
         plt.figure(figsize=(5, 5))
         plt.plot(fpr, tpr, marker='.', label=" (AUROC (unseen) {:.2f}".format(auc) + ")")
         plt.plot([0, 1], [0.5, 0.5], 'k--')
@@ -258,6 +254,7 @@ def profit_curve(y_true, y_score, print_graph):
         revenues.append(net_revenue)
 
     if print_graph:
+        plt = PLOTTING['pyplot']
         plt.figure(figsize=(5, 5))
         plt.plot(thresholds, revenues, marker='.', label="mlp")
         plt.plot([0, 1], [0, 0], 'k--')
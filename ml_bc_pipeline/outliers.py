@@ -0,0 +1,208 @@
+import numpy as np
+import pandas as pd
+from itertools import chain
+
+MULTIVARIATE = 'multi/unknown'
+
+
+def boxplot_exceedance(X, treshold=1.5):
+    """ Distance of each value beyond the boxplot whiskers of its column
+
+        Columns are standardized (z-scores) first, then the quartiles and IQR of every column are
+        computed in one pass. Values inside [Q1 - treshold * IQR, Q3 + treshold * IQR] get 0 and values
+        outside get their distance to the nearest whisker, so the result has the shape of X.
+
+    """
+    # the nan-aware reductions are much slower, only use them when needed
+    z = np.array(X, dtype=np.float64)
+    missing = np.isnan(z).any()
+    mean, std, percentile = (np.nanmean, np.nanstd, np.nanpercentile) if missing else (np.mean, np.std, np.percentile)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z -= mean(z, axis=0)
+        z /= std(z, axis=0)
+    q1, q3 = percentile(z, [25, 75], axis=0)
+    # the whiskers are symmetric around the middle of the box: |z - middle| - half width
+    z -= (q1 + q3) / 2
+    np.abs(z, out=z)
+    z -= (q3 - q1) / 2 + treshold * (q3 - q1)
+    return np.fmax(z, 0, out=z)
+
+
+def iqr_bounds(X, treshold=1.5):
+    """ Lower and upper boxplot whiskers (Q1 - treshold * IQR, Q3 + treshold * IQR) of X, per column if X is 2-D """
+    q1, q3 = np.percentile(X, [25, 75], axis=0)
+    return q1 - treshold * (q3 - q1), q3 + treshold * (q3 - q1)
+
+
+def winsorize(df, flagged, treshold=1.5):
+    """ Smooths the flagged cells of df to the boxplot whiskers of their columns and drops multivariate outliers
+
+        flagged is {id: [variables]}, as given by OutlierVotes.provenance. A flagged value above the mean of its
+        column is replaced by the upper whisker (Q3 + treshold * IQR), otherwise by the lower one (Q1 - treshold
+        * IQR); the bounds are computed once per column and each column is written in a single scatter. Records
+        flagged as MULTIVARIATE are dropped. Returns a new DataFrame, df is left untouched.
+
+    """
+    counts = [len(variables) for variables in flagged.values()]
+    positions = np.repeat(df.index.get_indexer(list(flagged.keys())), counts)
+    variables = np.array(list(chain.from_iterable(flagged.values())), dtype=object)
+    valid = positions >= 0
+    positions, variables = positions[valid], variables[valid]
+    multivariate = variables == MULTIVARIATE
+    smoothed = df.copy()
+    for variable, group in pd.Series(positions[~multivariate]).groupby(variables[~multivariate]):
+        column = df[variable].to_numpy(dtype=np.float64)
+        lower, upper = iqr_bounds(column, treshold)
+        values = column.copy()
+        values[group.values] = np.where(column[group.values] > column.mean(), upper, lower)
+        smoothed[variable] = values
+    keep = np.ones(len(df), dtype=bool)
+    keep[positions[multivariate]] = False
+    return smoothed[keep]
+
+
+def robust_z_scores(X, dtype=np.float64):
+    """ Modified z-scores (0.6745 * (x - median) / MAD) of every column of X, computed for all columns at once
+
+        dtype sets the precision of the computation; float32 halves the memory of the work matrix.
+
+    """
+    # work on a (variables x records) copy so each median runs over contiguous memory
+    z = np.array(np.asarray(X).T, dtype=dtype, order='C')
+    z -= np.median(z, axis=1)[:, np.newaxis]
+    mad = np.median(np.abs(z), axis=1)[:, np.newaxis]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z *= dtype(0.6745) / mad
+    return z.T
+
+
+def outlier_dict(mask, index, variables):
+    """ Turns a (records x variables) outlier mask into {id: [variables where the record is an outlier]} """
+    rows = np.flatnonzero(mask.any(axis=1))
+    variables = np.asarray(variables, dtype=object)
+    return {id_: list(variables[row]) for id_, row in zip(index[rows], mask[rows])}
+
+
+def rank_rows(exceedance):
+    """ Positions of the rows with any positive exceedance, sorted by their largest exceedance (descending) """
+    row_max = exceedance.max(axis=1)
+    flagged = np.flatnonzero(row_max > 0)
+    return flagged[np.argsort(-row_max[flagged], kind='mergesort')]
+
+
+def flagged_variables(exceedance, rows, variables):
+    """ For each row position in rows, the variables where it is an outlier, sorted by exceedance (descending) """
+    if len(rows) == 0:
+        return []
+    block = exceedance[rows]
+    order = np.argsort(-block, axis=1, kind='mergesort')
+    variables = np.asarray(variables, dtype=object)
+    return [list(variables[order_[block_[order_] > 0]]) for block_, order_ in zip(block, order)]
+
+
+class CoreSampleNovelty:
+    """ Novelty scoring for a fitted DBSCAN
+
+        DBSCAN cannot label new records, so a record is scored as an inlier (1) when it lies within eps of one
+        of the core samples found during the fit and as noise (-1) otherwise, as DBSCAN would label it.
+
+    """
+
+    def __init__(self, dbscan):
+        from sklearn.neighbors import NearestNeighbors
+        self.eps = dbscan.eps
+        self.neighbors = None
+        if len(dbscan.components_) > 0:
+            self.neighbors = NearestNeighbors(n_neighbors=1, metric=dbscan.metric).fit(dbscan.components_)
+
+    def predict(self, X):
+        if self.neighbors is None:
+            return -np.ones(len(X), dtype=np.int64)
+        distances, _ = self.neighbors.kneighbors(X)
+        return np.where(distances[:, 0] <= self.eps, 1, -1)
+
+
+class OutlierVotes:
+    """ Consensus of several outlier detectors
+
+        Votes are accumulated in an integer vector aligned to index, one pass per detector result. A result
+        can be:
+         - a dict {id: [variables]} (univariate detectors), worth one vote per variable;
+         - a boolean DataFrame mask (records x variables), worth one vote per flagged cell;
+         - a boolean array or Series aligned to index, or an array of ids (multivariate detectors), worth one
+           vote per flag.
+        The variables where each record was flagged are kept as provenance; records flagged by a multivariate
+        detector get MULTIVARIATE.
+
+    """
+
+    def __init__(self, index):
+        self.index = pd.Index(index)
+        self.votes = np.zeros(len(self.index), dtype=np.int64)
+        self._flags = {MULTIVARIATE: np.zeros(len(self.index), dtype=bool)}
+
+    def _flag(self, variable, positions):
+        if variable not in self._flags:
+            self._flags[variable] = np.zeros(len(self.index), dtype=bool)
+        self._flags[variable][positions] = True
+
+    def _positions(self, ids):
+        positions = self.index.get_indexer(ids)
+        return positions[positions >= 0]
+
+    def add(self, result):
+        if isinstance(result, dict):
+            counts = [len(variables) for variables in result.values()]
+            positions = np.repeat(self.index.get_indexer(list(result.keys())), counts)
+            variables = pd.Series(list(chain.from_iterable(result.values())), dtype=object)
+            valid = positions >= 0
+            positions, variables = positions[valid], variables[valid]
+            self.votes += np.bincount(positions, minlength=len(self.index))
+            for variable, group in pd.Series(positions).groupby(variables.values):
+                self._flag(variable, group.values)
+        elif isinstance(result, pd.DataFrame):
+            positions = self.index.get_indexer(result.index)
+            valid = positions >= 0
+            mask = result.values[valid].astype(bool)
+            np.add.at(self.votes, positions[valid], mask.sum(axis=1))
+            for variable, column in zip(result.columns, mask.T):
+                self._flag(variable, positions[valid][column])
+        else:
+            result = np.asarray(result)
+            if result.dtype == bool and result.shape == self.votes.shape:
+                positions = np.flatnonzero(result)
+            else:
+                positions = self._positions(result.ravel())
+            self.votes += np.bincount(positions, minlength=len(self.index))
+            self._flag(MULTIVARIATE, positions)
+        return self
+
+    def ranked(self):
+        """ Votes of every flagged record, sorted in descending order """
+        flagged = np.flatnonzero(self.votes > 0)
+        flagged = flagged[np.argsort(-self.votes[flagged], kind='mergesort')]
+        return pd.Series(self.votes[flagged], index=self.index[flagged])
+
+    def scores(self):
+        """ Votes of the flagged records min-max scaled to [0, 1], sorted in descending order """
+        ranked = self.ranked()
+        if ranked.empty:
+            return ranked.astype(np.float64)
+        span = ranked.max() - ranked.min()
+        return (ranked - ranked.min()) / (span if span > 0 else 1)
+
+    def select(self, treshold):
+        """ Ids of the records whose scaled votes exceed treshold """
+        scores = self.scores()
+        return scores.index[scores.values > treshold]
+
+    def provenance(self, ids=None):
+        """ {id: [variables where it was flagged]} for ids (all flagged records by default) """
+        ids = self.ranked().index if ids is None else ids
+        variables = list(self._flags)
+        flags = np.column_stack([self._flags[variable] for variable in variables])
+        positions = self.index.get_indexer(ids)
+        # multivariate flags go last so that univariate variables are smoothed before the record is dropped
+        variables = variables[1:] + variables[:1]
+        flags = np.roll(flags, -1, axis=1)
+        return outlier_dict(flags[positions], self.index[positions], variables)
@@ -0,0 +1,165 @@
+import os
+import inspect
+import tempfile
+from functools import partial
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from ml_bc_pipeline.streaming_stats import StreamingStats
+
+# /dev/shm is memory backed, so files there never hit the disk
+SHARED_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+
+DETECTORS = ['isolation_forest', 'extended_isolation_forest', 'mahalanobis_distance_outlier', 'dbscan_outlier_detection',
+             'elliptic_envelope_out', 'local_outlier_factor', 'one_class_svm', 'cooks_distance_outlier']
+
+
+class SharedMatrix:
+    """ Read-only matrix shared between processes
+
+        The matrix is written once to a memory-mapped .npy file (in /dev/shm when available) and worker
+        processes attach to it by path, so it is never pickled: all of them read the same pages.
+
+    """
+
+    def __init__(self, X):
+        X = np.ascontiguousarray(X)
+        fd, self.path = tempfile.mkstemp(suffix='.npy', dir=SHARED_DIR)
+        os.close(fd)
+        shared = np.lib.format.open_memmap(self.path, mode='w+', dtype=X.dtype, shape=X.shape)
+        shared[:] = X
+        shared.flush()
+        del shared
+
+    @staticmethod
+    def attach(path):
+        return np.load(path, mmap_mode='r')
+
+    def close(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_worker = {}
+
+
+def _init_detector_worker(path, index, columns, numerical_var, seed):
+    from ml_bc_pipeline.data_preprocessing import Processor
+    processor = Processor.__new__(Processor)
+    processor.training = pd.DataFrame(SharedMatrix.attach(path), index=index, columns=columns, copy=False)
+    processor.numerical_var = numerical_var
+    processor.seed = seed
+    processor.report = []
+    _worker['processor'] = processor
+
+
+def _run_detector(name, kwargs):
+    result = getattr(_worker['processor'], name)(**kwargs)
+    return result if isinstance(result, dict) else np.asarray(result)
+
+
+def _init_scoring_worker(path, scorer):
+    _worker['X'] = SharedMatrix.attach(path)
+    _worker['scorer'] = scorer
+
+
+def _score_rows(bounds):
+    start, stop = bounds
+    return _worker['scorer'](np.asarray(_worker['X'][start:stop]))
+
+
+def iter_chunk_scores(scorer, X, chunksize=100000, n_jobs=None):
+    """ Yields scorer(chunk) for consecutive chunks of chunksize rows of X, in order
+
+        Chunks are scored in a pool of n_jobs worker processes (all cores by default) that read X from a
+        SharedMatrix; the scorer (e.g. the predict method of a fitted estimator) is sent once to each worker.
+
+    """
+    X = np.asarray(X)
+    bounds = [(start, min(start + chunksize, X.shape[0])) for start in range(0, X.shape[0], chunksize)]
+    n_jobs = min(n_jobs or os.cpu_count(), len(bounds))
+    if n_jobs <= 1:
+        for start, stop in bounds:
+            yield scorer(X[start:stop])
+        return
+    with SharedMatrix(X) as shared:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_scoring_worker,
+                                 initargs=(shared.path, scorer)) as pool:
+            for scores in pool.map(_score_rows, bounds):
+                yield scores
+
+
+def score_in_chunks(scorer, X, chunksize=100000, n_jobs=None):
+    """ Scores all rows of X in parallel chunks (see iter_chunk_scores), filling one preallocated array as they arrive """
+    scores, start = np.empty(0), 0
+    for chunk_scores in iter_chunk_scores(scorer, X, chunksize, n_jobs):
+        chunk_scores = np.asarray(chunk_scores)
+        if start == 0:
+            scores = np.empty((len(X),) + chunk_scores.shape[1:], dtype=chunk_scores.dtype)
+        scores[start:start + len(chunk_scores)] = chunk_scores
+        start += len(chunk_scores)
+    return scores
+
+
+def _summarize(columns, k, seed, block):
+    return StreamingStats(columns, k, seed).update(block)
+
+
+def summarize_in_chunks(X, columns=None, chunksize=100000, n_jobs=None, k=256, seed=0):
+    """ StreamingStats of X, with the chunks summarized in parallel (see iter_chunk_scores) and then merged """
+    columns = list(X.columns if columns is None and isinstance(X, pd.DataFrame) else
+                   range(X.shape[1]) if columns is None else columns)
+    if isinstance(X, pd.DataFrame):
+        X = X[columns].values
+    stats = StreamingStats(columns, k, seed)
+    for chunk_stats in iter_chunk_scores(partial(_summarize, columns, k, seed), X, chunksize, n_jobs):
+        stats.merge(chunk_stats)
+    return stats
+
+
+class OutlierExecutor:
+    """ Runs several multivariate outlier detectors of a Processor at once
+
+        Each detector (one of DETECTORS) runs in its own worker process of a pool. The training data is
+        converted once to a float64 matrix and placed in a SharedMatrix, which every worker attaches to
+        instead of receiving a pickled copy, so a consensus run takes about as long as its slowest detector.
+        The cores are split between the pool and the detectors: those taking n_jobs get cpu_count // workers
+        each (unless given in their keyword arguments), so the pools they start do not oversubscribe the cores.
+
+    """
+
+    def __init__(self, processor, n_jobs=None):
+        self.processor = processor
+        self.n_jobs = n_jobs
+
+    def run(self, detectors):
+        """ Runs {detector name: keyword arguments} and returns {detector name: outliers found} """
+        unknown = set(detectors) - set(DETECTORS)
+        if unknown:
+            raise ValueError('Unknown outlier detectors: {}. Available: {}'.format(sorted(unknown), DETECTORS))
+        training = self.processor.training
+        n_jobs = min(self.n_jobs or os.cpu_count(), len(detectors))
+        inner_jobs = max(1, os.cpu_count() // n_jobs)
+        detectors = {name: dict(kwargs) for name, kwargs in detectors.items()}
+        for name, kwargs in detectors.items():
+            if 'n_jobs' in inspect.signature(getattr(type(self.processor), name)).parameters:
+                kwargs.setdefault('n_jobs', inner_jobs)
+        with SharedMatrix(training.astype(np.float64).values) as shared:
+            initargs = (shared.path, training.index, training.columns, self.processor.numerical_var,
+                        self.processor.seed)
+            with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_detector_worker, initargs=initargs) as pool:
+                futures = {name: pool.submit(_run_detector, name, kwargs) for name, kwargs in detectors.items()}
+                results = {name: future.result() for name, future in futures.items()}
+        self.processor.report.extend(detectors)
+        return results
+
+    def rank(self, detectors, smoothing, treshold):
+        """ Runs the detectors and feeds their results to Processor.outlier_rank """
+        results = self.run(detectors)
+        return self.processor.outlier_rank(smoothing, treshold, *results.values())
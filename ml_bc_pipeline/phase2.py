@@ -4,6 +4,7 @@ import numpy as np
 from sklearn.model_selection import train_test_split, StratifiedKFold, KFold
 from ml_bc_pipeline.data_loader import Dataset
 from ml_bc_pipeline.data_preprocessing import Processor
+from ml_bc_pipeline.frames import FrameView
 from ml_bc_pipeline.feature_engineering import FeatureEngineer
 from ml_bc_pipeline.model import gradientBoosting, grid_search_MLP, assess_generalization_auroc, decision_tree, \
     naive_bayes, logistic_regression, xgboost, ensemble, adaboost, extraTreesClassifier, gp_grid_search, gp, svc, \
@@ -62,14 +63,14 @@ def main():
         return averages
 
     # +++++++++++++++++ 1) load and prepare the data
-    ds = Dataset("ml_project1_data.xlsx").rm_df
+    ds = Dataset("ml_project1_data.xlsx", compact=True).rm_df
     # +++++++++++++++++ 2) split into train and unseen
-    DF_train, DF_unseen = train_test_split(ds.copy(), test_size=0.2, stratify=ds["Response"], random_state=0)
+    DF_train, DF_unseen = train_test_split(ds, test_size=0.2, stratify=ds["Response"], random_state=0)
 
     '''
     #EVALUATION
     # +++++++++++++++++ 3) preprocess, based on train
-    pr = Processor(DF_train.copy(), DF_unseen.copy(), 0)
+    pr = Processor(DF_train, DF_unseen, 0)
     pipeline['preprocessing'] = pr.report
 
     # +++++++++++++++++ 4) feature engineering
@@ -80,7 +81,7 @@ def main():
     #best_estimator =
     for seed in range(2,5):
         # +++++++++++++++++ 3) preprocess, based on train
-        pr = Processor(DF_train.copy(), DF_unseen.copy(), seed)
+        pr = Processor(DF_train, DF_unseen, seed)
         pipeline['preprocessing'] = pr.report
 
         # +++++++++++++++++ 4) feature engineering
@@ -131,8 +132,8 @@ def main():
             skf = StratifiedKFold(n_splits=cv_splits, shuffle=True)
 
         for train_index, test_index in skf.split(DF_train.loc[:, DF_train.columns != "Response"], DF_train['Response']):
-            train = DF_train.copy().iloc[train_index]
-            test = DF_train.copy().iloc[test_index]
+            train = FrameView(DF_train, train_index)
+            test = FrameView(DF_train, test_index)
             print('split')
             print("After Split:", train.shape, test.shape)
 
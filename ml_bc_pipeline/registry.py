@@ -0,0 +1,73 @@
+import importlib
+
+
+def lazy_import(target):
+    """ Imports "package.module" or "package.module:attribute" and returns the module or attribute """
+    module_name, _, attribute = target.partition(':')
+    module = importlib.import_module(module_name)
+    return getattr(module, attribute) if attribute else module
+
+
+class Registry:
+    """ Registry of backends imported on first use
+
+        Backends are registered by name with the "module:attribute" path of the object implementing
+        them, so registering them costs nothing: the module (and its heavy dependencies, e.g. xgboost,
+        imblearn or eif) is only imported the first time the backend is requested, and then cached.
+
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._targets = {}
+        self._loaded = {}
+
+    def register(self, key, target):
+        self._targets[key] = target
+        self._loaded.pop(key, None)
+
+    def __getitem__(self, key):
+        if key not in self._loaded:
+            if key not in self._targets:
+                raise KeyError('Unknown {} backend: {}. Available: {}'.format(self.name, key, sorted(self._targets)))
+            self._loaded[key] = lazy_import(self._targets[key])
+        return self._loaded[key]
+
+    def __contains__(self, key):
+        return key in self._targets
+
+    def keys(self):
+        return list(self._targets)
+
+    def is_loaded(self, key):
+        return key in self._loaded
+
+
+MODELS = Registry('model')
+MODELS.register('xgboost', 'xgboost:XGBClassifier')
+MODELS.register('symbolic_classifier', 'gplearn.genetic:SymbolicClassifier')
+MODELS.register('symbolic_regressor', 'gplearn.genetic:SymbolicRegressor')
+
+OPTIMIZERS = Registry('optimizer')
+OPTIMIZERS.register('bayesian_optimization', 'bayes_opt:BayesianOptimization')
+OPTIMIZERS.register('json_logger', 'bayes_opt.observer:JSONLogger')
+OPTIMIZERS.register('events', 'bayes_opt.event:Events')
+
+OUTLIER_DETECTORS = Registry('outlier detector')
+OUTLIER_DETECTORS.register('isolation_forest', 'sklearn.ensemble:IsolationForest')
+OUTLIER_DETECTORS.register('extended_isolation_forest', 'eif:iForest')
+OUTLIER_DETECTORS.register('dbscan', 'sklearn.cluster:DBSCAN')
+OUTLIER_DETECTORS.register('elliptic_envelope', 'sklearn.covariance:EllipticEnvelope')
+OUTLIER_DETECTORS.register('local_outlier_factor', 'sklearn.neighbors:LocalOutlierFactor')
+OUTLIER_DETECTORS.register('one_class_svm', 'sklearn.svm:OneClassSVM')
+
+FEATURE_SELECTORS = Registry('feature selector')
+FEATURE_SELECTORS.register('mfa', 'prince:MFA')
+FEATURE_SELECTORS.register('ga', 'ga_feature_selection.feature_selection_ga:FeatureSelectionGA')
+FEATURE_SELECTORS.register('smote_nc', 'imblearn.over_sampling:SMOTENC')
+FEATURE_SELECTORS.register('smote', 'imblearn.over_sampling:SMOTE')
+FEATURE_SELECTORS.register('adasyn', 'imblearn.over_sampling:ADASYN')
+
+PLOTTING = Registry('plotting')
+PLOTTING.register('pyplot', 'matplotlib.pyplot')
+PLOTTING.register('seaborn', 'seaborn')
@@ -0,0 +1,232 @@
+import numpy as np
+import pandas as pd
+from scipy.linalg import solve_triangular
+
+
+def _as_block(block):
+    block = np.asarray(block, dtype=np.float64)
+    return block.reshape(-1, 1) if block.ndim == 1 else block
+
+
+class RunningMoments:
+    """ Streaming per-column count, mean and variance
+
+        Each block updates the accumulator with its own count, mean and sum of squared deviations, combined
+        with the running ones by the parallel form of Welford's algorithm (Chan et al.), so accumulators filled
+        from different shards can be merged exactly. Missing values (NaN) are ignored.
+
+    """
+
+    def __init__(self, n_columns):
+        self.n = np.zeros(n_columns)
+        self.mean = np.zeros(n_columns)
+        self.m2 = np.zeros(n_columns)
+
+    def _combine(self, n, mean, m2):
+        total = self.n + n
+        with np.errstate(divide='ignore', invalid='ignore'):
+            delta = mean - self.mean
+            self.mean = np.where(total > 0, self.mean + delta * n / total, 0)
+            self.m2 = np.where(total > 0, self.m2 + m2 + delta ** 2 * self.n * n / total, 0)
+        self.n = total
+        return self
+
+    def update(self, block):
+        block = _as_block(block)
+        n = np.sum(~np.isnan(block), axis=0).astype(np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = np.where(n > 0, np.nansum(block, axis=0) / n, 0)
+        m2 = np.nansum((block - mean) ** 2, axis=0)
+        return self._combine(n, mean, m2)
+
+    def merge(self, other):
+        return self._combine(other.n, other.mean, other.m2)
+
+    def variance(self, ddof=0):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self.m2 / (self.n - ddof)
+
+    def std(self, ddof=0):
+        return np.sqrt(self.variance(ddof))
+
+
+class RunningCovariance:
+    """ Streaming mean and covariance matrix of complete rows (rows with a NaN are skipped)
+
+        Blocks are combined with the pairwise update of the co-moment matrix, which is exact and mergeable
+        across shards. Mahalanobis distances are computed from the Cholesky factor of the covariance, with a
+        pseudo-inverse fallback when it is singular.
+
+    """
+
+    def __init__(self, n_columns):
+        self.n = 0
+        self.mean = np.zeros(n_columns)
+        self.comoment = np.zeros((n_columns, n_columns))
+
+    def _combine(self, n, mean, comoment):
+        total = self.n + n
+        if n > 0:
+            delta = mean - self.mean
+            self.comoment = self.comoment + comoment + np.outer(delta, delta) * self.n * n / total
+            self.mean = self.mean + delta * n / total
+        self.n = total
+        return self
+
+    def update(self, block):
+        block = _as_block(block)
+        block = block[~np.isnan(block).any(axis=1)]
+        if len(block) == 0:
+            return self
+        mean = block.mean(axis=0)
+        centered = block - mean
+        return self._combine(len(block), mean, centered.T @ centered)
+
+    def merge(self, other):
+        return self._combine(other.n, other.mean, other.comoment)
+
+    def covariance(self, ddof=1):
+        return self.comoment / (self.n - ddof)
+
+    def mahalanobis(self, block, ddof=1):
+        """ Mahalanobis distance of each row of block to the running mean """
+        centered = _as_block(block) - self.mean
+        covariance = self.covariance(ddof)
+        try:
+            L = np.linalg.cholesky(covariance)
+            whitened = solve_triangular(L, centered.T, lower=True, check_finite=False)
+            return np.sqrt(np.einsum('ij,ij->j', whitened, whitened))
+        except np.linalg.LinAlgError:
+            return np.sqrt(np.einsum('ij,ij->i', centered @ np.linalg.pinv(covariance), centered))
+
+
+class QuantileSketch:
+    """ Mergeable quantile sketch of a stream of values (KLL compactor hierarchy)
+
+        Values enter level 0; a level holding more than its capacity is sorted and compacted by keeping every
+        other value (starting at a random offset), which moves into the next level with twice the weight.
+        Capacities shrink geometrically towards the lower levels, so the sketch holds O(k) values whatever
+        the stream length and ranks are approximated within about 1.7 / k of the total count. Two sketches
+        are merged by concatenating their levels and compacting again. Missing values (NaN) are ignored.
+
+    """
+
+    def __init__(self, k=256, seed=0):
+        self.k = k
+        self.n = 0
+        self.levels = [np.empty(0)]
+        self._random_state = np.random.RandomState(seed)
+
+    def _capacity(self, level):
+        return max(2, int(np.ceil(self.k * (2 / 3) ** (len(self.levels) - 1 - level))))
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            if len(self.levels[level]) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(self.levels[level])
+                # an odd item out stays at its level
+                keep, items = items[len(items) - len(items) % 2:], items[:len(items) - len(items) % 2]
+                promoted = items[self._random_state.randint(2)::2]
+                self.levels[level] = keep
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            level += 1
+        return self
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        self.n += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        return self._compress()
+
+    def merge(self, other):
+        for level, items in enumerate(other.levels):
+            if level == len(self.levels):
+                self.levels.append(np.empty(0))
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        return self._compress()
+
+    def quantile(self, q):
+        """ Approximate quantiles (q in [0, 1]) of the values seen so far, linearly interpolated """
+        items = np.concatenate(self.levels)
+        if len(items) == 0:
+            return np.full(np.shape(q), np.nan)
+        weights = np.concatenate([np.full(len(items_), 2.0 ** level) for level, items_ in enumerate(self.levels)])
+        order = np.argsort(items, kind='mergesort')
+        items, weights = items[order], weights[order]
+        # rank of each item taken at the middle of its weight, scaled to [0, 1]
+        ranks = np.cumsum(weights) - weights / 2
+        ranks = (ranks - ranks[0]) / max(ranks[-1] - ranks[0], np.finfo(np.float64).tiny)
+        return np.interp(q, ranks, items)
+
+
+class StreamingStats:
+    """ Per-column summaries of a table that is read in chunks
+
+        Keeps, for every column, a RunningMoments, a RunningCovariance and a QuantileSketch, so outlier
+        thresholds (boxplot whiskers, z-score bounds, Mahalanobis distances) can be computed on data that does
+        not fit in memory. Accumulators filled from different shards (e.g. in worker processes, see
+        ml_bc_pipeline.parallel.summarize_in_chunks) are combined with merge.
+
+    """
+
+    def __init__(self, columns, k=256, seed=0):
+        self.columns = list(columns)
+        self.moments = RunningMoments(len(self.columns))
+        self.covariance = RunningCovariance(len(self.columns))
+        self.sketches = [QuantileSketch(k, seed + i) for i in range(len(self.columns))]
+
+    @classmethod
+    def from_chunks(cls, chunks, columns=None, k=256, seed=0):
+        """ Summarizes an iterable of chunks (DataFrames, e.g. a StreamingDataset, or 2-D arrays) """
+        stats = None
+        for chunk in chunks:
+            if stats is None:
+                stats = cls(columns if columns is not None else
+                            (chunk.columns if isinstance(chunk, pd.DataFrame) else range(chunk.shape[1])), k, seed)
+            stats.update(chunk)
+        return stats
+
+    def update(self, chunk):
+        if isinstance(chunk, pd.DataFrame):
+            chunk = chunk[self.columns]
+        block = _as_block(chunk)
+        self.moments.update(block)
+        self.covariance.update(block)
+        for sketch, column in zip(self.sketches, block.T):
+            sketch.update(column)
+        return self
+
+    def merge(self, other):
+        self.moments.merge(other.moments)
+        self.covariance.merge(other.covariance)
+        for sketch, other_sketch in zip(self.sketches, other.sketches):
+            sketch.merge(other_sketch)
+        return self
+
+    def quantiles(self, q):
+        """ Approximate quantiles q of every column, as a (len(q) x columns) DataFrame """
+        return pd.DataFrame(np.column_stack([sketch.quantile(q) for sketch in self.sketches]),
+                            index=q, columns=self.columns)
+
+    def iqr_bounds(self, treshold=1.5):
+        """ Lower and upper boxplot whiskers (Q1 - treshold * IQR, Q3 + treshold * IQR) of every column """
+        q1, q3 = self.quantiles([0.25, 0.75]).values
+        return (pd.Series(q1 - treshold * (q3 - q1), index=self.columns),
+                pd.Series(q3 + treshold * (q3 - q1), index=self.columns))
+
+    def zscore_bounds(self, treshold=3, ddof=0):
+        """ Lower and upper bounds (mean -/+ treshold * std) of every column """
+        mean, std = self.moments.mean, self.moments.std(ddof)
+        return (pd.Series(mean - treshold * std, index=self.columns),
+                pd.Series(mean + treshold * std, index=self.columns))
+
+    def mahalanobis(self, chunk):
+        """ Mahalanobis distance of each record of chunk to the mean, for the covariance seen so far """
+        if isinstance(chunk, pd.DataFrame):
+            return pd.Series(self.covariance.mahalanobis(chunk[self.columns].values), index=chunk.index)
+        return self.covariance.mahalanobis(chunk)
@@ -1,6 +1,6 @@
 import numpy as np
 from sklearn.base import TransformerMixin
-from sklearn.preprocessing import StandardScaler
+from sklearn.preprocessing import StandardScaler, MinMaxScaler
 
 class CustomScaler(TransformerMixin):
     def __init__(self, continuous_idx, dummies_idx):
@@ -14,4 +14,63 @@ class CustomScaler(TransformerMixin):
 
     def transform(self, X, y=None, copy=None):
         X_head = self.scaler.transform(X[:, self.continuous_idx])
-        return np.concatenate((X_head, X[:, self.dummies_idx]), axis=1)
\ No newline at end of file
+        return np.concatenate((X_head, X[:, self.dummies_idx]), axis=1)
+
+
+class BlockScaler:
+    """ Min-max scaling of the continuous block of a DataFrame
+
+        The continuous columns are selected once and converted to a single contiguous array of dtype (float32 by
+        default), which is scaled in place, chunksize records at a time, before replacing the original columns.
+        Peak memory is about the size of the block itself. The scaler can be fitted chunk by chunk with
+        partial_fit and applied to streamed batches with transform.
+
+    """
+
+    def __init__(self, columns, dtype=np.float32, chunksize=100000):
+        self.columns = list(columns)
+        self.dtype = dtype
+        self.chunksize = chunksize
+        self.scaler = MinMaxScaler(copy=False)
+
+    @staticmethod
+    def continuous_columns(df, exclude=('Response',)):
+        """ Columns of df that are neither categorical nor object, except exclude """
+        dummies = set(df.select_dtypes(include=["category", "object"]).columns).union(exclude)
+        return [column for column in df.columns if column not in dummies]
+
+    def _block(self, df):
+        # Fortran order keeps every column contiguous, so columns are copied in and out without reshuffling
+        block = np.empty((len(df), len(self.columns)), dtype=self.dtype, order='F')
+        for j, column in enumerate(self.columns):
+            block[:, j] = df[column].values
+        return block
+
+    def _chunks(self, n):
+        return [slice(start, min(start + self.chunksize, n)) for start in range(0, n, self.chunksize)]
+
+    def partial_fit(self, df):
+        block = self._block(df)
+        for rows in self._chunks(len(block)):
+            self.scaler.partial_fit(block[rows])
+        return self
+
+    def _scale(self, df, block, inplace):
+        if not inplace:
+            df = df.copy()
+        for rows in self._chunks(len(block)):
+            block[rows] = self.scaler.transform(block[rows])
+        for j, column in enumerate(self.columns):
+            df[column] = block[:, j]
+        return df
+
+    def transform(self, df, inplace=False):
+        return self._scale(df, self._block(df), inplace)
+
+    def fit_transform(self, df, inplace=False):
+        """ Fits the scaler on df and scales it, converting the block only once """
+        block = self._block(df)
+        self.scaler = MinMaxScaler(copy=False)
+        for rows in self._chunks(len(block)):
+            self.scaler.partial_fit(block[rows])
+        return self._scale(df, block, inplace)